@@ -0,0 +1,206 @@
+from collections import OrderedDict
+import math
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # optional; what-if projections fall back to pure Python
+    np = None
+
+# Grade analytics behind /grades/summary.
+#
+# Scores are percentages (0-100) and a missing weight counts as 1. crud
+# does the heavy lifting with GROUP BY queries; this module turns those
+# aggregates into GPA figures, and evaluates what-if projections over the
+# raw (subject, score, weight) rows with NumPy when it is installed.
+
+GRADE_SUMMARY_CACHE_SIZE = int(os.getenv("GRADE_SUMMARY_CACHE_SIZE", 1024))
+
+# (minimum average, grade points), checked top-down.
+GPA_SCALE = (
+    (93, 4.0), (90, 3.7), (87, 3.3), (83, 3.0), (80, 2.7), (77, 2.3),
+    (73, 2.0), (70, 1.7), (67, 1.3), (63, 1.0), (60, 0.7), (0, 0.0),
+)
+BANDS = (("A", 90), ("B", 80), ("C", 70), ("D", 60), ("F", -math.inf))
+PERCENTILES = (10, 25, 50, 75, 90)
+# (first month, last month, name)
+TERMS = ((1, 5, "spring"), (6, 8, "summer"), (9, 12, "fall"))
+
+def grade_points(average):
+    for threshold, points in GPA_SCALE:
+        if average >= threshold:
+            return points
+    return 0.0
+
+def term_of(year: int, month: int):
+    for first, last, name in TERMS:
+        if first <= month <= last:
+            return f"{year}-{name}"
+
+def band_of(score: float):
+    for name, threshold in BANDS:
+        if score >= threshold:
+            return name
+
+def _rounded(value, digits=2):
+    return None if value is None else round(value, digits)
+
+def _percentile(ordered, p):
+    # Linear interpolation between closest ranks (NumPy's default method).
+    k = (len(ordered) - 1) * p / 100
+    low = math.floor(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+def percentiles(scores):
+    if not scores:
+        return {}
+    if np is not None:
+        values = np.percentile(np.asarray(scores, dtype=float), PERCENTILES)
+    else:
+        ordered = sorted(scores)
+        values = [_percentile(ordered, p) for p in PERCENTILES]
+    return {f"p{p}": round(float(value), 2) for p, value in zip(PERCENTILES, values)}
+
+def subject_summaries(subject_rows):
+    """Per-subject figures from ``(subject, weighted_sum, total_weight, count, min, max)`` rows."""
+    subjects = []
+    for subject, weighted_sum, total_weight, count, low, high in subject_rows:
+        average = weighted_sum / total_weight if total_weight else None
+        subjects.append({
+            "subject": subject,
+            "average": _rounded(average),
+            "grade_points": None if average is None else grade_points(average),
+            "count": count,
+            "total_weight": _rounded(total_weight),
+            "min": low,
+            "max": high,
+        })
+    return subjects
+
+def overall(subject_rows, subjects):
+    weighted_sum = sum(row[1] for row in subject_rows)
+    total_weight = sum(row[2] for row in subject_rows)
+    graded = [s for s in subjects if s["grade_points"] is not None and s["total_weight"]]
+    gpa_weight = sum(s["total_weight"] for s in graded)
+    return {
+        "count": sum(row[3] for row in subject_rows),
+        "overall_average": _rounded(weighted_sum / total_weight) if total_weight else None,
+        # Subjects count towards the GPA in proportion to their total weight (credits).
+        "gpa": _rounded(sum(s["grade_points"] * s["total_weight"] for s in graded) / gpa_weight) if gpa_weight else None,
+    }
+
+def term_trends(month_rows):
+    """Per-term and cumulative averages from ``(year, month, weighted_sum, total_weight, count)`` rows."""
+    terms = OrderedDict()
+    for year, month, weighted_sum, total_weight, count in month_rows:
+        entry = terms.setdefault(term_of(int(year), int(month)), [0.0, 0.0, 0])
+        entry[0] += weighted_sum
+        entry[1] += total_weight
+        entry[2] += count
+    trends = []
+    running_sum = running_weight = 0.0
+    previous = None
+    for term, (weighted_sum, total_weight, count) in terms.items():
+        running_sum += weighted_sum
+        running_weight += total_weight
+        average = weighted_sum / total_weight if total_weight else None
+        trends.append({
+            "term": term,
+            "average": _rounded(average),
+            "cumulative_average": _rounded(running_sum / running_weight) if running_weight else None,
+            "change": _rounded(average - previous) if average is not None and previous is not None else None,
+            "count": count,
+        })
+        previous = average if average is not None else previous
+    return trends
+
+def summarize(subject_rows, month_rows, scores):
+    subject_rows = list(subject_rows)
+    subjects = subject_summaries(subject_rows)
+    bands = {name: 0 for name, _ in BANDS}
+    for score in scores:
+        bands[band_of(score)] += 1
+    return dict(
+        overall(subject_rows, subjects),
+        subjects=subjects,
+        terms=term_trends(month_rows),
+        percentiles=percentiles(scores),
+        bands=bands,
+    )
+
+def _subject_rows(rows):
+    # Group (subject, score, weight) rows into the shape the GROUP BY query returns.
+    if not rows:
+        return []
+    if np is not None:
+        names, scores, weights = zip(*rows)
+        subjects, codes = np.unique(np.asarray(names, dtype=object).astype(str), return_inverse=True)
+        scores = np.asarray(scores, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        weighted_sums = np.bincount(codes, weights=scores * weights, minlength=len(subjects))
+        total_weights = np.bincount(codes, weights=weights, minlength=len(subjects))
+        counts = np.bincount(codes, minlength=len(subjects))
+        lows = np.full(len(subjects), np.inf)
+        highs = np.full(len(subjects), -np.inf)
+        np.minimum.at(lows, codes, scores)
+        np.maximum.at(highs, codes, scores)
+        return [
+            (str(subject), float(weighted_sums[i]), float(total_weights[i]), int(counts[i]), float(lows[i]), float(highs[i]))
+            for i, subject in enumerate(subjects)
+        ]
+    groups = {}
+    for subject, score, weight in rows:
+        entry = groups.setdefault(subject, [0.0, 0.0, 0, score, score])
+        entry[0] += score * weight
+        entry[1] += weight
+        entry[2] += 1
+        entry[3] = min(entry[3], score)
+        entry[4] = max(entry[4], score)
+    return [(subject, *groups[subject]) for subject in sorted(groups)]
+
+def project(rows):
+    """Subject averages and GPA over ``(subject, score, weight)`` rows, e.g. existing plus hypothetical grades."""
+    subject_rows = _subject_rows(rows)
+    subjects = subject_summaries(subject_rows)
+    return dict(overall(subject_rows, subjects), subjects=subjects)
+
+class SummaryCache:
+    """Per-user LRU of computed summaries tagged with the collection version they were built from.
+
+    A lookup with a newer version misses, so any write that bumps the
+    version (crud.create_grade) invalidates the entry in every worker.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (version, value)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id: int, version: int, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (version, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+grade_summary_cache = SummaryCache(GRADE_SUMMARY_CACHE_SIZE)
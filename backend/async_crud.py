@@ -0,0 +1,136 @@
+from functools import wraps
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import crud, database
+
+# Async versions of the crud functions.
+#
+# Each one accepts either session type handed out by database.get_session:
+# with an AsyncSession the sync crud code runs via AsyncSession.run_sync,
+# so its queries are awaited on the event loop; with a regular Session it
+# runs in Starlette's threadpool. Either way the caller never blocks the
+# loop, and the query logic lives in one place (crud.py).
+
+async def run(db, fn, *args, **kwargs):
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
+
+async def run_in_new_session(fn, *args, **kwargs):
+    """Run ``fn`` on its own short-lived session, so several calls can be awaited concurrently.
+
+    Each call checks out its own pooled connection for its duration.
+    """
+    if database.AsyncSessionLocal is not None:
+        async with database.AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    def call():
+        with database.SessionLocal() as db:
+            return fn(db, *args, **kwargs)
+    return await run_in_threadpool(call)
+
+async def commit(db):
+    if isinstance(db, Session):
+        return await run_in_threadpool(db.commit)
+    return await db.commit()
+
+async def rollback(db):
+    if isinstance(db, Session):
+        return await run_in_threadpool(db.rollback)
+    return await db.rollback()
+
+def _async(fn):
+    @wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run(db, fn, *args, **kwargs)
+    return wrapper
+
+# User
+get_user = _async(crud.get_user)
+get_user_by_email = _async(crud.get_user_by_email)
+create_user = _async(crud.create_user)
+update_user_password = _async(crud.update_user_password)
+
+# Token revocation
+revoke_token = _async(crud.revoke_token)
+is_token_revoked = _async(crud.is_token_revoked)
+get_revocations = _async(crud.get_revocations)
+
+# Tasks
+get_tasks = _async(crud.get_tasks)
+create_task = _async(crud.create_task)
+update_task = _async(crud.update_task)
+delete_task = _async(crud.delete_task)
+
+# Projects
+get_projects = _async(crud.get_projects)
+create_project = _async(crud.create_project)
+get_project_progress = _async(crud.get_project_progress)
+
+# Grades
+get_grades = _async(crud.get_grades)
+create_grade = _async(crud.create_grade)
+
+# Grade analytics
+get_grade_summary = _async(crud.get_grade_summary)
+project_grades = _async(crud.project_grades)
+
+# Events
+get_events = _async(crud.get_events)
+create_event = _async(crud.create_event)
+
+# Notes
+get_notes = _async(crud.get_notes)
+create_note = _async(crud.create_note)
+update_note = _async(crud.update_note)
+delete_note = _async(crud.delete_note)
+
+# Resources
+get_resources = _async(crud.get_resources)
+create_resource = _async(crud.create_resource)
+delete_resource = _async(crud.delete_resource)
+
+# Study Sessions
+get_study_sessions = _async(crud.get_study_sessions)
+create_study_session = _async(crud.create_study_session)
+update_study_session = _async(crud.update_study_session)
+delete_study_session = _async(crud.delete_study_session)
+
+# Calendar
+get_calendar = _async(crud.get_calendar)
+
+# Study rollups
+get_study_rollup = _async(crud.get_study_rollup)
+
+# Bulk operations
+bulk_create_tasks = _async(crud.bulk_create_tasks)
+bulk_update_tasks = _async(crud.bulk_update_tasks)
+bulk_delete_tasks = _async(crud.bulk_delete_tasks)
+bulk_create_notes = _async(crud.bulk_create_notes)
+bulk_update_notes = _async(crud.bulk_update_notes)
+bulk_delete_notes = _async(crud.bulk_delete_notes)
+bulk_create_study_sessions = _async(crud.bulk_create_study_sessions)
+bulk_update_study_sessions = _async(crud.bulk_update_study_sessions)
+bulk_delete_study_sessions = _async(crud.bulk_delete_study_sessions)
+
+# Tags
+get_tag_counts = _async(crud.get_tag_counts)
+
+# Collection versions
+get_collection_version = _async(crud.get_collection_version)
+
+# Sync
+get_changes = _async(crud.get_changes)
+
+# Search
+search_documents = _async(crud.search_documents)
+
+# Stats
+get_stats = _async(crud.get_stats)
+
+# Bootstrap
+get_upcoming_tasks = _async(crud.get_upcoming_tasks)
+get_recent_notes = _async(crud.get_recent_notes)
+get_week_study_sessions = _async(crud.get_week_study_sessions)
+get_bootstrap = _async(crud.get_bootstrap)
@@ -1,5 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import math
+import threading
+import time
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
@@ -10,21 +18,381 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key_here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+# Signing key ring, e.g. "2026-01:secret-a,2026-07:secret-b". SECRET_KEY is always
+# available as kid "default", which also verifies tokens issued without a kid.
+JWT_KEYS = os.getenv("JWT_KEYS", "")
+# Key that signs new tokens (default: the last one in JWT_KEYS, else "default").
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")
+# Revoked token ids are mirrored into a bloom filter sized for this many
+# entries at this false-positive rate (a positive is confirmed in the DB).
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", 100000))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", 0.001))
+# How often each worker picks up revocations made by other workers.
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+# Each sync re-reads revocations this far back, to catch transactions that committed late.
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 1024))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 300))
+# bcrypt runs on a dedicated, bounded pool so logins never stall the event loop.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 32))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+class PasswordHasherBusy(Exception):
+    pass
+
+class BoundedExecutor:
+    """Thread pool that rejects work instead of queueing without limit.
+
+    At most ``workers`` jobs run at once and ``queue_limit`` more may wait;
+    beyond that ``submit`` fails fast with PasswordHasherBusy. bcrypt
+    releases the GIL, so threads hash in parallel.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rejected = 0
+        self.completed = 0
+        self._executor = self._new_executor()
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Too many concurrent password operations, try again shortly")
+        with self._lock:
+            self._pending += 1
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._free()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.completed += 1
+        self._free()
+
+    def _free(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self._pending,
+                "queued": max(0, self._pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+    def shutdown(self):
+        # Swap in a fresh pool (threads start lazily) so a later lifespan in the
+        # same process, e.g. a second TestClient or the benchmark, can still hash.
+        with self._lock:
+            executor, self._executor = self._executor, self._new_executor()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+password_executor = BoundedExecutor(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_executor.submit(pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_executor.submit(pwd_context.hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await asyncio.wrap_future(password_executor.submit(pwd_context.verify, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(password_executor.submit(pwd_context.hash, password))
+
+# Signing keys
+class KeyRing:
+    """Signing keys by id. New tokens are signed with the active key and carry
+    its ``kid`` header; any key still in the ring verifies, so keys can be
+    rotated by adding a new active key and dropping the old one once the
+    tokens it signed have expired."""
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    def __init__(self, keys: dict, active_kid: str):
+        if active_kid not in keys:
+            raise ValueError(f"JWT_ACTIVE_KID {active_kid!r} is not in the key ring")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_env(cls):
+        keys = {"default": SECRET_KEY}
+        configured = [entry.split(":", 1) for entry in JWT_KEYS.split(",") if ":" in entry]
+        keys.update((kid.strip(), secret.strip()) for kid, secret in configured)
+        active = JWT_ACTIVE_KID or (configured[-1][0].strip() if configured else "default")
+        return cls(keys, active)
+
+    def sign(self, claims: dict):
+        return jwt.encode(claims, self.keys[self.active_kid], algorithm=ALGORITHM, headers={"kid": self.active_kid})
+
+    def verify(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid", "default")
+        key = self.keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key {kid!r}")
+        return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+key_ring = KeyRing.from_env()
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        expire = now + timedelta(minutes=15)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex, "type": token_type})
+    encoded_jwt = key_ring.sign(to_encode)
     return encoded_jwt
+
+def create_refresh_token(sub: str):
+    return create_access_token({"sub": sub}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), token_type="refresh")
+
+def create_token_pair(sub: str):
+    return {
+        "access_token": create_access_token({"sub": sub}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": create_refresh_token(sub),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def decode_token(token: str, token_type: str = "access"):
+    """Verified claims of a token of the given type; raises JWTError otherwise."""
+    payload = key_ring.verify(token)
+    # Tokens issued before refresh tokens existed carry no type and are access tokens.
+    if payload.get("type", "access") != token_type:
+        raise JWTError(f"Not an {token_type} token")
+    if payload.get("sub") is None:
+        raise JWTError("Token has no subject")
+    return payload
+
+# Revocation filter
+class BloomBits:
+    """A fixed-size bloom filter; RevocationFilter swaps in a new one to grow."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, jti: str):
+        # Double hashing: k probes derived from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, jti: str):
+        added = False
+        for position in self.positions(jti):
+            mask = 1 << (position & 7)
+            added = added or not self.array[position >> 3] & mask
+            self.array[position >> 3] |= mask
+        # Re-adding an id (e.g. the sync echoing a local revocation) is not counted.
+        self.count += added
+
+    def contains(self, jti: str):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self.positions(jti))
+
+class RevocationFilter:
+    """Bloom filter over revoked token ids (``jti``).
+
+    ``might_contain`` is a handful of bit probes with no DB access; it has
+    no false negatives, and its rare false positives are settled by an
+    exact lookup in the revoked_tokens table. Revocations from other
+    workers are folded in by ``apply`` at most every
+    REVOCATION_SYNC_SECONDS (see main.sync_revocations).
+
+    Syncs read by ``revoked_at`` and re-read the last
+    REVOCATION_SYNC_OVERLAP_SECONDS, so a revocation whose transaction
+    commits late is still picked up by the next sync.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._bloom = BloomBits(capacity, error_rate)
+        self._recent = {}  # jti -> revoked_at of rows the next sync will read again
+        self._journal = None  # local adds made while a rebuild is loading
+        self.synced_through = None
+        self.synced_at = 0.0
+
+    @property
+    def capacity(self):
+        return self._bloom.capacity
+
+    @property
+    def count(self):
+        return self._bloom.count
+
+    def _add(self, jti: str):
+        self._bloom.add(jti)
+        if self._journal is not None:
+            self._journal.append(jti)
+
+    def add(self, jti: str):
+        with self._lock:
+            self._add(jti)
+
+    def might_contain(self, jti: str):
+        # A single read of _bloom, so a concurrent rebuild is seen whole or not at all.
+        return self._bloom.contains(jti)
+
+    def sync_due(self):
+        # Claims the next sync slot, so concurrent requests don't all query.
+        now = time.monotonic()
+        with self._lock:
+            if now - self.synced_at < REVOCATION_SYNC_SECONDS:
+                return False
+            self.synced_at = now
+            return True
+
+    def apply(self, rows, started: datetime):
+        """Add ``(revoked_at, jti)`` rows read by a sync that began at ``started``.
+
+        Returns False once over capacity (rebuild needed).
+        """
+        fresh = []
+        with self._lock:
+            for revoked_at, jti in rows:
+                if jti not in self._recent:
+                    self._recent[jti] = revoked_at
+                    self._add(jti)
+                    fresh.append(jti)
+            self.synced_through = started - timedelta(seconds=REVOCATION_SYNC_OVERLAP_SECONDS)
+            self._recent = {jti: at for jti, at in self._recent.items() if at >= self.synced_through}
+            within_capacity = self._bloom.count <= self._bloom.capacity
+        for jti in fresh:
+            principal_cache.revoke(jti)
+        return within_capacity
+
+    def begin_rebuild(self):
+        # Ids revoked locally while the rebuild loads are replayed into the new bits.
+        with self._lock:
+            self._journal = []
+
+    def cancel_rebuild(self):
+        with self._lock:
+            self._journal = None
+
+    def rebuild(self, capacity: int, rows):
+        """Swap in a filter of ``capacity`` built from all unexpired ``(revoked_at, jti)`` rows.
+
+        The new bits are filled off to the side; lookups use the old ones
+        until the swap.
+        """
+        bloom = BloomBits(capacity, self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        with self._lock:
+            for jti in self._journal or ():
+                bloom.add(jti)
+            self._bloom = bloom
+            self._journal = None
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            "count": bloom.count,
+            "capacity": bloom.capacity,
+            "bits": bloom.bits,
+            "hashes": bloom.hashes,
+            "bytes": len(bloom.array),
+            "synced_through": self.synced_through.isoformat() if self.synced_through else None,
+            "overlap_rows": len(self._recent),
+        }
+
+# Principal cache
+class PrincipalCache:
+    """LRU cache of authenticated principals keyed by bearer token.
+
+    Entries live for at most ``ttl`` seconds and never outlive the token's
+    own ``exp`` claim, so a hit can skip both ``jwt.decode`` and the users
+    table lookup.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token -> (expires_at, sub, principal, jti)
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, token: str, sub: str, principal, exp: Optional[float] = None, jti: Optional[str] = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._entries[token] = (expires_at, sub, principal, jti)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sub: str):
+        with self._lock:
+            stale = [token for token, entry in self._entries.items() if entry[1] == sub]
+            for token in stale:
+                del self._entries[token]
+
+    def revoke(self, jti: str):
+        with self._lock:
+            stale = [token for token, entry in self._entries.items() if entry[3] == jti]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+revoked_tokens = RevocationFilter(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
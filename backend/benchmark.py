@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Load-test harness for the API.
+#
+# Seeds per-user datasets through crud's bulk insert helpers (so search,
+# tags, stats and rollups are maintained exactly as in production), then
+# drives the real FastAPI app in-process over ASGI and reports latency
+# percentiles, throughput and queries per request for each scenario.
+#
+#   python benchmark.py --database-url sqlite:///./benchmark.db --save base.json
+#   python benchmark.py --database-url sqlite:///./benchmark.db --compare base.json
+#
+# Point --database-url at a scratch Postgres database to benchmark against
+# the production engine. Datasets are reused when the benchmark users
+# already exist, so later runs skip seeding. With --compare the exit
+# status is 1 when any scenario regressed past --threshold.
+
+SEED_PASSWORD = "benchmark"
+SEED_BATCH_SIZE = 2000
+SUBJECTS = ("Calculus", "Physics", "Algorithms", "Databases", "Linear Algebra", "History")
+TAGS = ("exam", "homework", "reading", "lab", "project", "review", "urgent")
+
+# Scenario query counts are attributed through a context variable: it is
+# copied into the threadpool (sync sessions) and greenlet (async sessions)
+# that run each request's queries.
+query_counter = contextvars.ContextVar("benchmark_query_counter", default=None)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SmartBrain API in-process.")
+    parser.add_argument("--database-url", help="database to seed and run against (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=1, help="benchmark users to seed and rotate through")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42, help="random seed for datasets and request mix")
+    parser.add_argument("--seed-only", action="store_true", help="seed the datasets and exit")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    parser.add_argument("--access-log", action="store_true", help="keep the per-request access log on the console")
+    return parser.parse_args(argv)
+
+# Seeding
+def _batches(count: int, size: int = SEED_BATCH_SIZE):
+    for start in range(0, count, size):
+        yield range(start, min(start + size, count))
+
+def _tags(rng):
+    return ",".join(rng.sample(TAGS, rng.randint(0, 3))) or None
+
+def seed_user(db, index: int, args, rng):
+    import crud, schemas
+
+    email = f"bench{index}@example.com"
+    user = crud.get_user_by_email(db, email)
+    if user is not None:
+        return user
+    started = time.perf_counter()
+    user = crud.create_user(db, schemas.UserCreate(email=email, password=SEED_PASSWORD))
+    today = date.today()
+
+    projects = crud.insert_projects(db, [
+        {"title": f"Project {i}", "description": None, "deadline": today + timedelta(days=rng.randint(-30, 120))}
+        for i in range(args.projects)
+    ], user.id)
+    project_ids = [project.id for project in projects]
+    db.commit()
+
+    for batch in _batches(args.tasks):
+        crud.insert_tasks(db, [{
+            "title": f"Task {i}",
+            "description": "Seeded by benchmark.py",
+            "due_date": today + timedelta(days=rng.randint(-60, 60)) if rng.random() < 0.8 else None,
+            "is_completed": rng.random() < 0.4,
+            "priority": rng.choice(("Low", "Medium", "High")),
+            "status": rng.choice(("Todo", "In Progress", "Done")),
+            "tags": _tags(rng),
+            "project_id": rng.choice(project_ids) if project_ids and rng.random() < 0.7 else None,
+        } for i in batch], user.id)
+        db.commit()
+
+    for batch in _batches(args.notes):
+        crud.insert_notes(db, [{
+            "title": f"Note {i} on {rng.choice(SUBJECTS)}",
+            "content": " ".join(rng.choice(SUBJECTS).lower() for _ in range(rng.randint(20, 80))),
+            "tags": _tags(rng),
+            "created_at": today - timedelta(days=rng.randint(0, 365)),
+            "updated_at": None,
+        } for i in batch], user.id)
+        db.commit()
+
+    for batch in _batches(args.sessions):
+        crud.insert_study_sessions(db, [{
+            "subject": rng.choice(SUBJECTS),
+            "duration_minutes": rng.randint(10, 180),
+            "date": today - timedelta(days=rng.randint(0, 730)),
+        } for _ in batch], user.id)
+        db.commit()
+
+    print(f"Seeded {email} in {time.perf_counter() - started:.1f}s")
+    return user
+
+# Scenarios
+class Client:
+    """One benchmark user: a logged-in token plus the task ids it may update."""
+
+    def __init__(self, email: str, token: str, task_ids):
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.task_ids = task_ids
+
+def _task_body(rng, title: str):
+    return {"title": title, "is_completed": rng.random() < 0.5, "priority": rng.choice(("Low", "Medium", "High")), "tags": _tags(rng)}
+
+async def login(http, client, rng, args):
+    return await http.post("/token", data={"username": client.email, "password": SEED_PASSWORD})
+
+async def list_tasks(http, client, rng, args):
+    return await http.get("/tasks/", params={"limit": args.page_size}, headers=client.headers)
+
+async def list_notes(http, client, rng, args):
+    return await http.get("/notes/", params={"limit": args.page_size}, headers=client.headers)
+
+async def list_study_sessions(http, client, rng, args):
+    return await http.get("/study-sessions/", params={"limit": args.page_size}, headers=client.headers)
+
+async def stats(http, client, rng, args):
+    return await http.get("/stats/", headers=client.headers)
+
+async def create_task(http, client, rng, args):
+    return await http.post("/tasks/", json=_task_body(rng, "Benchmark task"), headers=client.headers)
+
+async def update_task(http, client, rng, args):
+    task_id = rng.choice(client.task_ids)
+    return await http.put(f"/tasks/{task_id}", json=_task_body(rng, f"Task {task_id}"), headers=client.headers)
+
+SCENARIOS = {
+    "login": login,
+    "list_tasks": list_tasks,
+    "list_notes": list_notes,
+    "list_study_sessions": list_study_sessions,
+    "stats": stats,
+    "create_task": create_task,
+    "update_task": update_task,
+}
+
+# Runner
+def percentile(ordered, p):
+    # Nearest-rank percentile of an already sorted list.
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+async def run_scenario(http, clients, name: str, args, rng):
+    scenario = SCENARIOS[name]
+    latencies, queries = [], []
+    errors = 0
+
+    # Warm-up requests run first on a single client, so the measured window
+    # starts with caches and the connection pool already primed.
+    for i in range(args.warmup):
+        await scenario(http, clients[i % len(clients)], rng, args)
+
+    pending = iter(range(args.requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            counter = [0]
+            query_counter.set(counter)
+            start = time.perf_counter()
+            response = await scenario(http, clients[i % len(clients)], rng, args)
+            latencies.append(time.perf_counter() - start)
+            queries.append(counter[0])
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "queries_per_request": round(sum(queries) / len(queries), 2),
+    }
+
+async def run_benchmark(args, names):
+    import httpx
+    from sqlalchemy import event
+    import database, main, models
+
+    def count_query(*_):
+        counter = query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+    for engine in filter(None, (database.engine, database.async_engine and database.async_engine.sync_engine)):
+        event.listen(engine, "before_cursor_execute", count_query)
+
+    results = {}
+    async with main.lifespan(main.app):
+        rng = random.Random(args.seed)
+        with database.SessionLocal() as db:
+            users = [seed_user(db, i, args, rng) for i in range(args.users)]
+            task_ids = {
+                user.id: [row.id for row in db.query(models.Task.id).filter(models.Task.user_id == user.id).limit(1000)]
+                for user in users
+            }
+        if args.seed_only:
+            return results
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            clients = []
+            for user in users:
+                response = await http.post("/token", data={"username": user.email, "password": SEED_PASSWORD})
+                response.raise_for_status()
+                clients.append(Client(user.email, response.json()["access_token"], task_ids[user.id]))
+            print_header()
+            for name in names:
+                # Each scenario draws from its own stream, so its request mix does
+                # not depend on whether seeding ran or which scenarios came before.
+                results[name] = await run_scenario(http, clients, name, args, random.Random(f"{args.seed}-{name}"))
+                print_row(name, results[name])
+    return results
+
+# Reporting
+COLUMNS = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request")
+# Metric -> +1 when larger is better, -1 when smaller is better. p99 is
+# reported but not compared: at a few hundred requests it is a single sample.
+COMPARED = {"p50_ms": -1, "p95_ms": -1, "throughput_rps": 1, "queries_per_request": -1}
+# Query counts barely move between runs (only with the data a write touches),
+# so they get an absolute allowance instead of a percentage.
+QUERY_TOLERANCE = 0.5
+
+def print_header():
+    print(f"{'scenario':<22}" + "".join(f"{column:>20}" for column in COLUMNS))
+
+def print_row(name, result):
+    print(f"{name:<22}" + "".join(f"{result[column]:>20}" for column in COLUMNS))
+
+def compare(baseline, current, threshold: float):
+    """Print per-metric changes against a baseline run; return the regressions found."""
+    regressions = []
+    print(f"\n{'scenario':<22}{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric, direction in COMPARED.items():
+            old, new = before[metric], result[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            if metric == "queries_per_request":
+                regressed = new - old > QUERY_TOLERANCE
+            else:
+                regressed = -direction * change > threshold
+            if regressed:
+                regressions.append((name, metric, old, new))
+            print(f"{name:<22}{metric:<22}{old:>12}{new:>12}{change:>+9.1f}%" + ("  REGRESSED" if regressed else ""))
+    return regressions
+
+def cli(argv=None):
+    args = parse_args(argv)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if not args.access_log:
+        os.environ.setdefault("LOG_LEVELS", "smartbrain.access=WARNING")
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = asyncio.run(run_benchmark(args, names))
+    if args.seed_only:
+        return 0
+
+    import database
+    run = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "dialect": database.engine.dialect.name,
+            "async_db": database.USE_ASYNC_DB,
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("save", "compare", "database_url")},
+        },
+        "scenarios": results,
+    }
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(run, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        regressions = compare(baseline, run, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold}%")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,104 @@
+from collections import defaultdict
+import asyncio
+import importlib
+import os
+import threading
+
+# Change feed behind GET /events/stream.
+#
+# crud stages row-level change events during a write and publishes them
+# once the transaction commits (see crud.publish_changes). The default bus
+# delivers them to the subscribers of the same process. Multi-worker
+# deployments plug in a broker-backed bus via EVENT_BUS="module:factory":
+# it subclasses InProcessBus, forwards ``publish`` to the broker and hands
+# every message it receives back to ``deliver``.
+
+EVENT_BUS = os.getenv("EVENT_BUS", "")
+# Events buffered per subscriber; a client that falls further behind gets a
+# single resync event instead of the backlog.
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 256))
+
+RESYNC = {"op": "resync"}
+
+class Subscription:
+    """One connected client: a bounded queue fed from any thread."""
+
+    def __init__(self, bus, user_id: int, maxsize: int):
+        self.bus = bus
+        self.user_id = user_id
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+        self._loop = asyncio.get_running_loop()
+
+    def put(self, events):
+        self._loop.call_soon_threadsafe(self._put, events)
+
+    def _put(self, events):
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind to patch incrementally: replace the backlog.
+                self.dropped += self._queue.qsize()
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                self._queue.put_nowait(RESYNC)
+                return
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class InProcessBus:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int):
+        subscription = Subscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def wants(self, user_id: int):
+        # Writers skip building events nobody will receive. Broker-backed buses
+        # cannot see other workers' subscribers and should return True.
+        return user_id in self._subscribers
+
+    def publish(self, user_id: int, events):
+        self.published += len(events)
+        self.deliver(user_id, events)
+
+    def deliver(self, user_id: int, events):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(events)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._subscribers),
+                "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "published": self.published,
+            }
+
+def load_bus():
+    if not EVENT_BUS:
+        return InProcessBus()
+    module, _, factory = EVENT_BUS.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+bus = load_bus()
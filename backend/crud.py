@@ -1,6 +1,33 @@
-from sqlalchemy.orm import Session
-import models, schemas
-from auth import get_password_hash
+from sqlalchemy import Date, case, cast, delete, extract, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import event as sa_event
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, selectinload
+from datetime import date, datetime, timedelta
+import base64
+import heapq
+import itertools
+import json
+import logging
+import os
+import models, schemas, search, tagging, recurrence, analytics, changefeed
+from auth import get_password_hash, principal_cache
+
+logger = logging.getLogger("smartbrain.crud")
+
+# When enabled, /stats/ reads the incrementally maintained user_stats row
+# instead of aggregating over the user's full history.
+MATERIALIZED_STATS = os.getenv("MATERIALIZED_STATS", "false").lower() in ("1", "true", "yes")
+# When enabled, study rollups read the study_daily table (always maintained
+# on write) instead of grouping the raw sessions.
+STUDY_DAILY_ROLLUP = os.getenv("STUDY_DAILY_ROLLUP", "true").lower() in ("1", "true", "yes")
+# Average session length that counts as a 100% focus score.
+FOCUS_TARGET_MINUTES = int(os.getenv("FOCUS_TARGET_MINUTES", 50))
+# Larger writes (bulk, import) publish one resync event instead of a row per event.
+CHANGE_EVENT_MAX_ROWS = int(os.getenv("CHANGE_EVENT_MAX_ROWS", 500))
+# Days a deletion is kept for /sync; older tokens get a full resync. 0 keeps tombstones forever.
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", 30))
 
 # User
 def get_user(db: Session, user_id: int):
@@ -9,21 +36,106 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(db_user.email)
     return db_user
 
+def update_user_password(db: Session, user: models.User, password: str):
+    user.hashed_password = get_password_hash(password)
+    db.commit()
+    principal_cache.invalidate(user.email)
+    return user
+
+# Token revocation
+def revoke_token(db: Session, jti: str, expires_at: datetime, user_id: int = None):
+    """Record a revoked token id; returns False if it was already revoked.
+
+    Expired revocations are pruned on the way, since their tokens fail
+    verification on their own.
+    """
+    now = datetime.utcnow()
+    db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at < now))
+    try:
+        with db.begin_nested():
+            db.add(models.RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=now))
+    except IntegrityError:
+        db.commit()
+        return False
+    db.commit()
+    return True
+
+def is_token_revoked(db: Session, jti: str):
+    return db.execute(select(models.RevokedToken.id).where(models.RevokedToken.jti == jti)).first() is not None
+
+def get_revocations(db: Session, since: datetime = None):
+    """``(revoked_at, jti)`` of unexpired revocations made at or after ``since``, oldest first."""
+    table = models.RevokedToken
+    query = select(table.revoked_at, table.jti).where(table.expires_at >= datetime.utcnow())
+    if since is not None:
+        query = query.where(table.revoked_at >= since)
+    return db.execute(query.order_by(table.revoked_at)).all()
+
+# Pagination
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(user_id: int, last_id: int):
+    raw = json.dumps([user_id, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, user_id: int):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_user_id, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_user_id != user_id or not isinstance(last_id, int):
+        raise InvalidCursor("Cursor does not belong to this collection")
+    return last_id
+
+def paginate(query, model, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, columns=None):
+    """Return ``(items, next_cursor)`` for a per-user query ordered by ``(user_id, id)``.
+
+    With a cursor the page starts right after the last id seen (keyset), so
+    the cost does not depend on how deep the page is. Without one, ``skip``
+    is applied as a plain offset for compatibility. One extra row is fetched
+    to tell whether another page exists. Passing ``columns`` (which must
+    include ``id``) returns plain ``Row`` tuples instead of ORM objects.
+    """
+    if columns is not None:
+        query = query.with_entities(*columns)
+    query = query.order_by(model.user_id, model.id)
+    if cursor:
+        query = query.filter(model.id > decode_cursor(cursor, user_id))
+    elif skip:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = encode_cursor(user_id, items[-1].id) if items and len(rows) > limit else None
+    return items, next_cursor
+
 # Tasks
-def get_tasks(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Task).filter(models.Task.user_id == user_id).offset(skip).limit(limit).all()
+def get_tasks(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, tag: str = None, columns=None):
+    query = db.query(models.Task).filter(models.Task.user_id == user_id)
+    if tag:
+        query = tagging.filter_by_tag(query, models.Task, "task", user_id, tag)
+    return paginate(query, models.Task, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
 
 def create_task(db: Session, task: schemas.TaskCreate, user_id: int):
-    db_task = models.Task(**task.dict(), user_id=user_id)
+    versions = bump_version(db, user_id, "tasks", "projects")
+    db_task = models.Task(**task.dict(), user_id=user_id, row_version=versions["tasks"])
     db.add(db_task)
+    db.flush()
+    search.index_document(db, "task", db_task)
+    tagging.sync_item_tags(db, user_id, "task", [(db_task.id, db_task.tags)])
+    bump_stats(db, user_id, pending_tasks=int(not db_task.is_completed))
+    publish_changes(db, user_id, "tasks", versions["tasks"], upserted=[db_task])
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -31,8 +143,15 @@ def create_task(db: Session, task: schemas.TaskCreate, user_id: int):
 def update_task(db: Session, task_id: int, task: schemas.TaskCreate, user_id: int):
     db_task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.user_id == user_id).first()
     if db_task:
+        was_pending = not db_task.is_completed
+        versions = bump_version(db, user_id, "tasks", "projects")
         for key, value in task.dict().items():
             setattr(db_task, key, value)
+        db_task.row_version = versions["tasks"]
+        search.index_document(db, "task", db_task)
+        tagging.sync_item_tags(db, user_id, "task", [(db_task.id, db_task.tags)])
+        bump_stats(db, user_id, pending_tasks=int(not db_task.is_completed) - int(was_pending))
+        publish_changes(db, user_id, "tasks", versions["tasks"], upserted=[db_task])
         db.commit()
         db.refresh(db_task)
     return db_task
@@ -40,50 +159,154 @@ def update_task(db: Session, task_id: int, task: schemas.TaskCreate, user_id: in
 def delete_task(db: Session, task_id: int, user_id: int):
     db_task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.user_id == user_id).first()
     if db_task:
+        versions = bump_version(db, user_id, "tasks", "projects")
         db.delete(db_task)
+        record_tombstones(db, user_id, "tasks", [db_task.id], versions["tasks"])
+        search.remove_documents(db, "task", [db_task.id])
+        tagging.remove_item_tags(db, "task", [db_task.id])
+        bump_stats(db, user_id, pending_tasks=-int(not db_task.is_completed))
+        publish_changes(db, user_id, "tasks", versions["tasks"], deleted=[db_task.id])
         db.commit()
     return db_task
 
 # Projects
-def get_projects(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).filter(models.Project.user_id == user_id).offset(skip).limit(limit).all()
+def get_project_progress(db: Session, user_id: int, project_ids):
+    """Task counts per project id from one grouped query; projects without tasks are absent."""
+    if not project_ids:
+        return {}
+    task = models.Task
+    overdue = (task.is_completed == False) & (task.due_date < date.today())
+    rows = db.execute(
+        select(task.project_id, func.count(), _count_where(db, task.is_completed == True), _count_where(db, overdue))
+        .where(task.user_id == user_id, task.project_id.in_(project_ids))
+        .group_by(task.project_id)
+    )
+    return {
+        project_id: schemas.ProjectProgress(
+            total=total, done=done, overdue=overdue_count,
+            percent_complete=round(100 * done / total, 1) if total else 0.0,
+        )
+        for project_id, total, done, overdue_count in rows
+    }
+
+def get_projects(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, include_tasks: bool = False):
+    """Projects with their task progress, and their tasks when ``include_tasks`` is set.
+
+    Tasks are loaded up front in one extra query: serializing Project.tasks
+    must never lazy-load (one query per project, and not allowed at all
+    under an AsyncSession). Without them only the project columns are read.
+    """
+    query = db.query(models.Project).filter(models.Project.user_id == user_id)
+    if include_tasks:
+        query = query.options(selectinload(models.Project.tasks))
+        columns = None
+    else:
+        columns = [getattr(models.Project, name) for name in schemas.ProjectRow.model_fields]
+    items, next_cursor = paginate(query, models.Project, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
+    progress = get_project_progress(db, user_id, [item.id for item in items])
+    if not include_tasks:
+        return [dict(row._asdict(), progress=progress.get(row.id, schemas.ProjectProgress())) for row in items], next_cursor
+    for project in items:
+        project.progress = progress.get(project.id, schemas.ProjectProgress())
+    return items, next_cursor
 
 def create_project(db: Session, project: schemas.ProjectCreate, user_id: int):
-    db_project = models.Project(**project.dict(), user_id=user_id)
+    versions = bump_version(db, user_id, "projects")
+    db_project = models.Project(**project.dict(), user_id=user_id, row_version=versions["projects"])
     db.add(db_project)
+    publish_changes(db, user_id, "projects", versions["projects"], upserted=[db_project])
     db.commit()
     db.refresh(db_project)
+    db.refresh(db_project, ["tasks"])
     return db_project
 
 # Grades
-def get_grades(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Grade).filter(models.Grade.user_id == user_id).offset(skip).limit(limit).all()
+def get_grades(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, columns=None):
+    query = db.query(models.Grade).filter(models.Grade.user_id == user_id)
+    return paginate(query, models.Grade, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
 
 def create_grade(db: Session, grade: schemas.GradeCreate, user_id: int):
-    db_grade = models.Grade(**grade.dict(), user_id=user_id)
+    versions = bump_version(db, user_id, "grades")
+    db_grade = models.Grade(**grade.dict(), user_id=user_id, row_version=versions["grades"])
     db.add(db_grade)
+    publish_changes(db, user_id, "grades", versions["grades"], upserted=[db_grade])
     db.commit()
     db.refresh(db_grade)
     return db_grade
 
+# Grade analytics
+def aggregate_grades(db: Session, user_id: int):
+    weight = func.coalesce(models.Grade.weight, 1.0)
+    scored = (models.Grade.user_id == user_id, models.Grade.score.isnot(None))
+    subjects = db.execute(
+        select(models.Grade.subject, func.sum(models.Grade.score * weight), func.sum(weight), func.count(),
+               func.min(models.Grade.score), func.max(models.Grade.score))
+        .where(*scored)
+        .group_by(models.Grade.subject)
+        .order_by(models.Grade.subject)
+    ).all()
+    year, month = extract("year", models.Grade.date), extract("month", models.Grade.date)
+    months = db.execute(
+        select(year, month, func.sum(models.Grade.score * weight), func.sum(weight), func.count())
+        .where(*scored, models.Grade.date.isnot(None))
+        .group_by(year, month)
+        .order_by(year, month)
+    ).all()
+    scores = db.scalars(select(models.Grade.score).where(*scored)).all()
+    return analytics.summarize(subjects, months, scores)
+
+def get_grade_summary(db: Session, user_id: int):
+    # Keyed by the grades collection version, which crud.create_grade bumps.
+    version = get_collection_version(db, user_id, "grades")
+    summary = analytics.grade_summary_cache.get(user_id, version)
+    if summary is None:
+        summary = aggregate_grades(db, user_id)
+        analytics.grade_summary_cache.set(user_id, version, summary)
+    return summary
+
+def project_grades(db: Session, user_id: int, hypothetical):
+    rows = db.execute(
+        select(models.Grade.subject, models.Grade.score, func.coalesce(models.Grade.weight, 1.0))
+        .where(models.Grade.user_id == user_id, models.Grade.score.isnot(None))
+    ).all()
+    rows = [tuple(row) for row in rows] + [(grade.subject, grade.score, grade.weight) for grade in hypothetical]
+    return analytics.project(rows)
+
 # Events
-def get_events(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Event).filter(models.Event.user_id == user_id).offset(skip).limit(limit).all()
+def get_events(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, columns=None):
+    query = db.query(models.Event).filter(models.Event.user_id == user_id)
+    return paginate(query, models.Event, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
 
 def create_event(db: Session, event: schemas.EventCreate, user_id: int):
-    db_event = models.Event(**event.dict(), user_id=user_id)
+    values = event.dict()
+    values["start_time"] = recurrence.to_utc(values["start_time"])
+    values["end_time"] = recurrence.to_utc(values["end_time"])
+    values["recurrence"] = recurrence.normalize_rule(values["recurrence"])
+    series_end = recurrence.series_end(values["start_time"], values["end_time"], values["recurrence"])
+    versions = bump_version(db, user_id, "events")
+    db_event = models.Event(**values, series_end=series_end, user_id=user_id, row_version=versions["events"])
     db.add(db_event)
+    publish_changes(db, user_id, "events", versions["events"], upserted=[db_event])
     db.commit()
     db.refresh(db_event)
     return db_event
 
 # Notes
-def get_notes(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Note).filter(models.Note.user_id == user_id).offset(skip).limit(limit).all()
+def get_notes(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, tag: str = None, columns=None):
+    query = db.query(models.Note).filter(models.Note.user_id == user_id)
+    if tag:
+        query = tagging.filter_by_tag(query, models.Note, "note", user_id, tag)
+    return paginate(query, models.Note, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
 
 def create_note(db: Session, note: schemas.NoteCreate, user_id: int):
-    db_note = models.Note(**note.dict(), user_id=user_id)
+    versions = bump_version(db, user_id, "notes")
+    db_note = models.Note(**note.dict(), user_id=user_id, row_version=versions["notes"])
     db.add(db_note)
+    db.flush()
+    search.index_document(db, "note", db_note)
+    tagging.sync_item_tags(db, user_id, "note", [(db_note.id, db_note.tags)])
+    bump_stats(db, user_id, notes_count=1)
+    publish_changes(db, user_id, "notes", versions["notes"], upserted=[db_note])
     db.commit()
     db.refresh(db_note)
     return db_note
@@ -91,8 +314,13 @@ def create_note(db: Session, note: schemas.NoteCreate, user_id: int):
 def update_note(db: Session, note_id: int, note: schemas.NoteCreate, user_id: int):
     db_note = db.query(models.Note).filter(models.Note.id == note_id, models.Note.user_id == user_id).first()
     if db_note:
+        versions = bump_version(db, user_id, "notes")
         for key, value in note.dict().items():
             setattr(db_note, key, value)
+        db_note.row_version = versions["notes"]
+        search.index_document(db, "note", db_note)
+        tagging.sync_item_tags(db, user_id, "note", [(db_note.id, db_note.tags)])
+        publish_changes(db, user_id, "notes", versions["notes"], upserted=[db_note])
         db.commit()
         db.refresh(db_note)
     return db_note
@@ -100,17 +328,31 @@ def update_note(db: Session, note_id: int, note: schemas.NoteCreate, user_id: in
 def delete_note(db: Session, note_id: int, user_id: int):
     db_note = db.query(models.Note).filter(models.Note.id == note_id, models.Note.user_id == user_id).first()
     if db_note:
+        versions = bump_version(db, user_id, "notes")
         db.delete(db_note)
+        record_tombstones(db, user_id, "notes", [db_note.id], versions["notes"])
+        search.remove_documents(db, "note", [db_note.id])
+        tagging.remove_item_tags(db, "note", [db_note.id])
+        bump_stats(db, user_id, notes_count=-1)
+        publish_changes(db, user_id, "notes", versions["notes"], deleted=[db_note.id])
         db.commit()
     return db_note
 
 # Resources
-def get_resources(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Resource).filter(models.Resource.user_id == user_id).offset(skip).limit(limit).all()
+def get_resources(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, tag: str = None, columns=None):
+    query = db.query(models.Resource).filter(models.Resource.user_id == user_id)
+    if tag:
+        query = tagging.filter_by_tag(query, models.Resource, "resource", user_id, tag)
+    return paginate(query, models.Resource, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
 
 def create_resource(db: Session, resource: schemas.ResourceCreate, user_id: int):
-    db_resource = models.Resource(**resource.dict(), user_id=user_id)
+    versions = bump_version(db, user_id, "resources")
+    db_resource = models.Resource(**resource.dict(), user_id=user_id, row_version=versions["resources"])
     db.add(db_resource)
+    db.flush()
+    search.index_document(db, "resource", db_resource)
+    tagging.sync_item_tags(db, user_id, "resource", [(db_resource.id, db_resource.tags)])
+    publish_changes(db, user_id, "resources", versions["resources"], upserted=[db_resource])
     db.commit()
     db.refresh(db_resource)
     return db_resource
@@ -118,33 +360,47 @@ def create_resource(db: Session, resource: schemas.ResourceCreate, user_id: int)
 def delete_resource(db: Session, resource_id: int, user_id: int):
     db_resource = db.query(models.Resource).filter(models.Resource.id == resource_id, models.Resource.user_id == user_id).first()
     if db_resource:
+        versions = bump_version(db, user_id, "resources")
         db.delete(db_resource)
+        record_tombstones(db, user_id, "resources", [db_resource.id], versions["resources"])
+        search.remove_documents(db, "resource", [db_resource.id])
+        tagging.remove_item_tags(db, "resource", [db_resource.id])
+        publish_changes(db, user_id, "resources", versions["resources"], deleted=[db_resource.id])
         db.commit()
     return db_resource
 
 # Study Sessions
-def get_study_sessions(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    sessions = db.query(models.StudySession).filter(models.StudySession.user_id == user_id).offset(skip).limit(limit).all()
-    with open("backend_debug.log", "a") as f:
-        f.write(f"DEBUG: get_study_sessions for user {user_id}: found {len(sessions)} sessions\n")
-    return sessions
+def get_study_sessions(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, columns=None):
+    query = db.query(models.StudySession).filter(models.StudySession.user_id == user_id)
+    sessions, next_cursor = paginate(query, models.StudySession, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
+    logger.debug("Listed study sessions", extra={"user_id": user_id, "count": len(sessions)})
+    return sessions, next_cursor
 
 def create_study_session(db: Session, study_session: schemas.StudySessionCreate, user_id: int):
-    with open("backend_debug.log", "a") as f:
-        f.write(f"DEBUG: create_study_session for user {user_id}: {study_session}\n")
-    db_study_session = models.StudySession(**study_session.dict(), user_id=user_id)
+    logger.debug("Creating study session", extra={"user_id": user_id, "study_session": study_session.dict()})
+    versions = bump_version(db, user_id, "study_sessions")
+    db_study_session = models.StudySession(**study_session.dict(), user_id=user_id, row_version=versions["study_sessions"])
     db.add(db_study_session)
+    bump_stats(db, user_id, study_minutes=db_study_session.duration_minutes, study_sessions_count=1)
+    bump_study_daily(db, user_id, [_daily_delta(db_study_session, 1)])
+    publish_changes(db, user_id, "study_sessions", versions["study_sessions"], upserted=[db_study_session])
     db.commit()
     db.refresh(db_study_session)
-    with open("backend_debug.log", "a") as f:
-        f.write(f"DEBUG: created session id {db_study_session.id}\n")
+    logger.debug("Created study session", extra={"user_id": user_id, "study_session_id": db_study_session.id})
     return db_study_session
 
 def update_study_session(db: Session, session_id: int, study_session: schemas.StudySessionCreate, user_id: int):
     db_session = db.query(models.StudySession).filter(models.StudySession.id == session_id, models.StudySession.user_id == user_id).first()
     if db_session:
+        old_minutes = db_session.duration_minutes
+        old_daily = _daily_delta(db_session, -1)
+        versions = bump_version(db, user_id, "study_sessions")
         for key, value in study_session.dict().items():
             setattr(db_session, key, value)
+        db_session.row_version = versions["study_sessions"]
+        bump_stats(db, user_id, study_minutes=db_session.duration_minutes - old_minutes)
+        bump_study_daily(db, user_id, [old_daily, _daily_delta(db_session, 1)])
+        publish_changes(db, user_id, "study_sessions", versions["study_sessions"], upserted=[db_session])
         db.commit()
         db.refresh(db_session)
     return db_session
@@ -152,23 +408,835 @@ def update_study_session(db: Session, session_id: int, study_session: schemas.St
 def delete_study_session(db: Session, session_id: int, user_id: int):
     db_session = db.query(models.StudySession).filter(models.StudySession.id == session_id, models.StudySession.user_id == user_id).first()
     if db_session:
+        versions = bump_version(db, user_id, "study_sessions")
         db.delete(db_session)
+        record_tombstones(db, user_id, "study_sessions", [db_session.id], versions["study_sessions"])
+        bump_stats(db, user_id, study_minutes=-db_session.duration_minutes, study_sessions_count=-1)
+        bump_study_daily(db, user_id, [_daily_delta(db_session, -1)])
+        publish_changes(db, user_id, "study_sessions", versions["study_sessions"], deleted=[db_session.id])
         db.commit()
     return db_session
 
+# Calendar
+CALENDAR_MAX_ITEMS = int(os.getenv("CALENDAR_MAX_ITEMS", 5000))
+
+def _event_items(event, start: datetime, end: datetime):
+    for occurrence_start, occurrence_end in recurrence.occurrences(
+        event.start_time, event.end_time, event.recurrence, start, end
+    ):
+        yield {"kind": "event", "id": event.id, "title": event.title, "start": occurrence_start,
+               "end": occurrence_end, "recurring": event.recurrence is not None}
+
+def get_calendar(db: Session, user_id: int, start: datetime, end: datetime, limit: int = CALENDAR_MAX_ITEMS):
+    """Events, task due dates and study sessions overlapping ``[start, end)``, ordered by start.
+
+    Each source is one range query on a ``(user_id, <time>)`` index.
+    Recurring events are expanded lazily and all sources are merged as
+    streams, so nothing past ``limit`` items is ever generated.
+    """
+    start, end = recurrence.to_utc(start), recurrence.to_utc(end)
+    first_day, last_day = start.date(), (end - timedelta(microseconds=1)).date()
+    events = (
+        db.query(models.Event)
+        .filter(
+            models.Event.user_id == user_id,
+            models.Event.start_time < end,
+            or_(models.Event.series_end.is_(None), models.Event.series_end >= start),
+        )
+        .order_by(models.Event.start_time)
+        .all()
+    )
+    tasks = db.execute(
+        select(models.Task.id, models.Task.title, models.Task.due_date, models.Task.is_completed)
+        .where(models.Task.user_id == user_id, models.Task.due_date >= first_day, models.Task.due_date <= last_day)
+        .order_by(models.Task.due_date, models.Task.id)
+    ).all()
+    sessions = db.execute(
+        select(models.StudySession.id, models.StudySession.subject, models.StudySession.date,
+               models.StudySession.duration_minutes)
+        .where(models.StudySession.user_id == user_id, models.StudySession.date >= first_day,
+               models.StudySession.date <= last_day)
+        .order_by(models.StudySession.date, models.StudySession.id)
+    ).all()
+    task_items = (
+        dict(zip(("start", "end"), recurrence.day_bounds(row.due_date)),
+             kind="task", id=row.id, title=row.title, all_day=True, is_completed=row.is_completed)
+        for row in tasks
+    )
+    session_items = (
+        dict(zip(("start", "end"), recurrence.day_bounds(row.date)),
+             kind="study_session", id=row.id, title=row.subject, all_day=True, duration_minutes=row.duration_minutes)
+        for row in sessions
+    )
+    feed = heapq.merge(*(_event_items(event, start, end) for event in events), task_items, session_items, key=lambda item: item["start"])
+    return list(itertools.islice(feed, limit))
+
+# Bulk operations
+def _bulk_create(db: Session, model, values, user_id: int, row_version: int):
+    rows = [dict(row, user_id=user_id, row_version=row_version) for row in values]
+    if not rows:
+        return []
+    created = db.scalars(insert(model).returning(model, sort_by_parameter_order=True), rows).all()
+    publish_changes(db, user_id, model.__tablename__, row_version, upserted=created)
+    # Detach before commit so serializing the response doesn't refresh each row.
+    for obj in created:
+        db.expunge(obj)
+    return created
+
+def _bulk_update(db: Session, model, patches, user_id: int, row_version: int, tracked=()):
+    """Apply partial updates by id in one executemany.
+
+    Returns ``(before, changes, results)`` where ``before`` maps id to the
+    pre-update values of the ``tracked`` columns and ``changes`` maps id to
+    the fields that were set.
+    """
+    changes = {}
+    for patch in patches:
+        changes.setdefault(patch.id, {}).update(patch.dict(exclude_unset=True, exclude={"id"}))
+    columns = [model.id] + [getattr(model, name) for name in tracked]
+    before = {
+        row.id: row
+        for row in db.execute(select(*columns).where(model.user_id == user_id, model.id.in_(list(changes))))
+    }
+    results = [{"id": item_id, "status": "updated" if item_id in before else "not_found"} for item_id in changes]
+    changes = {item_id: values for item_id, values in changes.items() if item_id in before}
+    params = [dict(values, id=item_id, row_version=row_version) for item_id, values in changes.items() if values]
+    if params:
+        db.execute(update(model), params)
+    publish_changes(db, user_id, model.__tablename__, row_version, patched=changes)
+    return before, changes, results
+
+def _bulk_delete(db: Session, model, ids, user_id: int, row_version: int, tracked=()):
+    columns = [model.id] + [getattr(model, name) for name in tracked]
+    deleted = db.execute(
+        delete(model).where(model.user_id == user_id, model.id.in_(ids)).returning(*columns)
+    ).all()
+    record_tombstones(db, user_id, model.__tablename__, [row.id for row in deleted], row_version)
+    publish_changes(db, user_id, model.__tablename__, row_version, deleted=[row.id for row in deleted])
+    found = {row.id for row in deleted}
+    results = [{"id": item_id, "status": "deleted" if item_id in found else "not_found"} for item_id in dict.fromkeys(ids)]
+    return deleted, results
+
+def insert_tasks(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "tasks", "projects")
+    created = _bulk_create(db, models.Task, values, user_id, versions["tasks"])
+    search.index_documents(db, "task", created)
+    tagging.sync_item_tags(db, user_id, "task", [(obj.id, obj.tags) for obj in created])
+    bump_stats(db, user_id, pending_tasks=sum(not t.is_completed for t in created))
+    return created
+
+def bulk_create_tasks(db: Session, tasks, user_id: int):
+    created = insert_tasks(db, [task.dict() for task in tasks], user_id)
+    db.commit()
+    return created
+
+def bulk_update_tasks(db: Session, patches, user_id: int):
+    versions = bump_version(db, user_id, "tasks", "projects")
+    before, changes, results = _bulk_update(db, models.Task, patches, user_id, versions["tasks"], tracked=("is_completed",))
+    pending_delta = sum(
+        int(not values["is_completed"]) - int(not before[task_id].is_completed)
+        for task_id, values in changes.items() if "is_completed" in values
+    )
+    search.index_documents(db, "task", db.query(models.Task).filter(models.Task.id.in_(list(changes))))
+    tagging.sync_item_tags(db, user_id, "task", [(i, v["tags"]) for i, v in changes.items() if "tags" in v])
+    bump_stats(db, user_id, pending_tasks=pending_delta)
+    db.commit()
+    return results
+
+def bulk_delete_tasks(db: Session, ids, user_id: int):
+    versions = bump_version(db, user_id, "tasks", "projects")
+    deleted, results = _bulk_delete(db, models.Task, ids, user_id, versions["tasks"], tracked=("is_completed",))
+    search.remove_documents(db, "task", [row.id for row in deleted])
+    tagging.remove_item_tags(db, "task", [row.id for row in deleted])
+    bump_stats(db, user_id, pending_tasks=-sum(not row.is_completed for row in deleted))
+    db.commit()
+    return results
+
+def insert_notes(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "notes")
+    created = _bulk_create(db, models.Note, values, user_id, versions["notes"])
+    search.index_documents(db, "note", created)
+    tagging.sync_item_tags(db, user_id, "note", [(obj.id, obj.tags) for obj in created])
+    bump_stats(db, user_id, notes_count=len(created))
+    return created
+
+def bulk_create_notes(db: Session, notes, user_id: int):
+    created = insert_notes(db, [note.dict() for note in notes], user_id)
+    db.commit()
+    return created
+
+def bulk_update_notes(db: Session, patches, user_id: int):
+    versions = bump_version(db, user_id, "notes")
+    _, changes, results = _bulk_update(db, models.Note, patches, user_id, versions["notes"])
+    search.index_documents(db, "note", db.query(models.Note).filter(models.Note.id.in_(list(changes))))
+    tagging.sync_item_tags(db, user_id, "note", [(i, v["tags"]) for i, v in changes.items() if "tags" in v])
+    db.commit()
+    return results
+
+def bulk_delete_notes(db: Session, ids, user_id: int):
+    versions = bump_version(db, user_id, "notes")
+    deleted, results = _bulk_delete(db, models.Note, ids, user_id, versions["notes"])
+    search.remove_documents(db, "note", [row.id for row in deleted])
+    tagging.remove_item_tags(db, "note", [row.id for row in deleted])
+    bump_stats(db, user_id, notes_count=-len(deleted))
+    db.commit()
+    return results
+
+def insert_study_sessions(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "study_sessions")
+    created = _bulk_create(db, models.StudySession, values, user_id, versions["study_sessions"])
+    bump_stats(db, user_id, study_minutes=sum(s.duration_minutes for s in created), study_sessions_count=len(created))
+    bump_study_daily(db, user_id, [_daily_delta(s, 1) for s in created])
+    return created
+
+def bulk_create_study_sessions(db: Session, study_sessions, user_id: int):
+    created = insert_study_sessions(db, [study_session.dict() for study_session in study_sessions], user_id)
+    db.commit()
+    return created
+
+def insert_resources(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "resources")
+    created = _bulk_create(db, models.Resource, values, user_id, versions["resources"])
+    search.index_documents(db, "resource", created)
+    tagging.sync_item_tags(db, user_id, "resource", [(obj.id, obj.tags) for obj in created])
+    return created
+
+def insert_projects(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "projects")
+    return _bulk_create(db, models.Project, values, user_id, versions["projects"])
+
+def insert_grades(db: Session, values, user_id: int):
+    versions = bump_version(db, user_id, "grades")
+    return _bulk_create(db, models.Grade, values, user_id, versions["grades"])
+
+def insert_events(db: Session, values, user_id: int):
+    rows = []
+    for event in values:
+        event = dict(event, start_time=recurrence.to_utc(event["start_time"]), end_time=recurrence.to_utc(event["end_time"]),
+                     recurrence=recurrence.normalize_rule(event["recurrence"]))
+        rows.append(dict(event, series_end=recurrence.series_end(event["start_time"], event["end_time"], event["recurrence"])))
+    versions = bump_version(db, user_id, "events")
+    return _bulk_create(db, models.Event, rows, user_id, versions["events"])
+
+def bulk_update_study_sessions(db: Session, patches, user_id: int):
+    versions = bump_version(db, user_id, "study_sessions")
+    before, changes, results = _bulk_update(
+        db, models.StudySession, patches, user_id, versions["study_sessions"],
+        tracked=("duration_minutes", "date", "subject"),
+    )
+    minutes_delta = sum(
+        values["duration_minutes"] - before[session_id].duration_minutes
+        for session_id, values in changes.items() if "duration_minutes" in values
+    )
+    bump_stats(db, user_id, study_minutes=minutes_delta)
+    daily = []
+    for session_id, values in changes.items():
+        old = before[session_id]._asdict()
+        daily += [_daily_delta(old, -1), _daily_delta(dict(old, **values), 1)]
+    bump_study_daily(db, user_id, daily)
+    db.commit()
+    return results
+
+def bulk_delete_study_sessions(db: Session, ids, user_id: int):
+    versions = bump_version(db, user_id, "study_sessions")
+    deleted, results = _bulk_delete(
+        db, models.StudySession, ids, user_id, versions["study_sessions"],
+        tracked=("duration_minutes", "date", "subject"),
+    )
+    bump_stats(db, user_id, study_minutes=-sum(row.duration_minutes for row in deleted), study_sessions_count=-len(deleted))
+    bump_study_daily(db, user_id, [_daily_delta(row._asdict(), -1) for row in deleted])
+    db.commit()
+    return results
+
+# Tags
+def get_tag_counts(db: Session, user_id: int, item_type: str = None):
+    return tagging.tag_counts(db, user_id, item_type)
+
+# Collection versions
+def get_collection_version(db: Session, user_id: int, collection: str):
+    db_version = db.get(models.CollectionVersion, (user_id, collection))
+    return db_version.version if db_version else 0
+
+def bump_version(db: Session, user_id: int, *collections: str):
+    """Increment the per-user version of each collection inside the caller's transaction.
+
+    The version backs the list endpoints' ETags and the sync tokens, so
+    every write to a collection must bump it before touching any rows and
+    stamp the returned version on them. Bumping first also holds the
+    version row lock until commit, so versions are committed in order.
+    Returns a dict of collection to its new version.
+    """
+    table = models.CollectionVersion.__table__
+    dialect = db.get_bind().dialect.name
+    versions = {}
+    for collection in collections:
+        if dialect in ("postgresql", "sqlite"):
+            upsert = postgresql.insert(table) if dialect == "postgresql" else sqlite.insert(table)
+            versions[collection] = db.execute(
+                upsert.values(user_id=user_id, collection=collection, version=1).on_conflict_do_update(
+                    index_elements=[table.c.user_id, table.c.collection],
+                    set_={"version": table.c.version + 1},
+                ).returning(table.c.version)
+            ).scalar_one()
+        else:
+            updated = db.execute(
+                update(table).where(table.c.user_id == user_id, table.c.collection == collection)
+                .values(version=table.c.version + 1)
+            )
+            if updated.rowcount == 0:
+                db.execute(insert(table).values(user_id=user_id, collection=collection, version=1))
+            versions[collection] = db.execute(
+                select(table.c.version).where(table.c.user_id == user_id, table.c.collection == collection)
+            ).scalar_one()
+    return versions
+
+# Sync
+SYNC_COLLECTIONS = {
+    "tasks": models.Task,
+    "notes": models.Note,
+    "resources": models.Resource,
+    "projects": models.Project,
+    "grades": models.Grade,
+    "events": models.Event,
+    "study_sessions": models.StudySession,
+}
+
+class InvalidSyncToken(ValueError):
+    pass
+
+def encode_sync_token(versions):
+    return base64.urlsafe_b64encode(json.dumps(versions, separators=(",", ":")).encode()).decode()
+
+def decode_sync_token(token: str):
+    try:
+        versions = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise InvalidSyncToken("Invalid sync token")
+    if not isinstance(versions, dict) or not all(
+        collection in SYNC_COLLECTIONS and isinstance(version, int) and not isinstance(version, bool)
+        for collection, version in versions.items()
+    ):
+        raise InvalidSyncToken("Invalid sync token")
+    return versions
+
+def record_tombstones(db: Session, user_id: int, collection: str, ids, row_version: int):
+    if ids:
+        now = datetime.utcnow()
+        db.execute(insert(models.Tombstone), [
+            {"user_id": user_id, "collection": collection, "ref_id": ref_id, "row_version": row_version, "deleted_at": now}
+            for ref_id in ids
+        ])
+        prune_tombstones(db, user_id, collection, now)
+
+def prune_tombstones(db: Session, user_id: int, collection: str, now: datetime):
+    """Drop tombstones past the retention window and raise the collection's pruned_version.
+
+    Runs after ``bump_version``, so the version row lock is held. Everything
+    up to the newest expired version goes, which keeps pruned_version exact:
+    a token at or above it still has all of its deletions on record.
+    """
+    if TOMBSTONE_RETENTION_DAYS <= 0:
+        return
+    tombstones = models.Tombstone
+    scope = (tombstones.user_id == user_id, tombstones.collection == collection)
+    floor = db.scalar(select(func.max(tombstones.row_version)).where(
+        *scope, tombstones.deleted_at < now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    ))
+    if floor is None:
+        return
+    db.execute(delete(tombstones).where(*scope, tombstones.row_version <= floor))
+    table = models.CollectionVersion.__table__
+    db.execute(update(table).where(table.c.user_id == user_id, table.c.collection == collection)
+               .values(pruned_version=floor))
+
+# Change events
+CHANGE_SCHEMAS = {
+    "tasks": schemas.Task,
+    "notes": schemas.Note,
+    "resources": schemas.Resource,
+    "projects": schemas.ProjectRow,
+    "grades": schemas.Grade,
+    "events": schemas.Event,
+    "study_sessions": schemas.StudySession,
+}
+
+def publish_changes(db: Session, user_id: int, collection: str, row_version: int, upserted=(), patched=None, deleted=()):
+    """Stage change events for the current transaction; they go out on commit.
+
+    ``upserted`` are ORM rows (sent whole), ``patched`` maps id to the
+    fields a bulk update set, ``deleted`` are ids. Nothing is built when
+    the bus has no subscriber for the user.
+    """
+    if not changefeed.bus.wants(user_id):
+        return
+    db.info.setdefault("pending_changes", []).append(
+        (user_id, collection, row_version, list(upserted), dict(patched or {}), list(deleted))
+    )
+
+def _change_events(collection: str, row_version: int, upserted, patched, deleted):
+    if len(upserted) + len(patched) + len(deleted) > CHANGE_EVENT_MAX_ROWS:
+        return [dict(changefeed.RESYNC, collection=collection, row_version=row_version)]
+    schema = CHANGE_SCHEMAS[collection]
+    base = {"collection": collection, "row_version": row_version}
+    return (
+        [dict(base, op="upsert", id=obj.id, data=schema.model_validate(obj, from_attributes=True).dict()) for obj in upserted]
+        + [dict(base, op="patch", id=item_id, data=values) for item_id, values in patched.items() if values]
+        + [dict(base, op="delete", id=item_id) for item_id in deleted]
+    )
+
+@sa_event.listens_for(Session, "before_commit")
+def _serialize_changes(session):
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    # Rows still pending get their ids (and defaults) before being serialized.
+    session.flush()
+    ready = session.info.setdefault("ready_changes", {})
+    for user_id, collection, row_version, upserted, patched, deleted in pending:
+        ready.setdefault(user_id, []).extend(_change_events(collection, row_version, upserted, patched, deleted))
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    for user_id, events in session.info.pop("ready_changes", {}).items():
+        changefeed.bus.publish(user_id, events)
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("pending_changes", None)
+    session.info.pop("ready_changes", None)
+
+def get_changes(db: Session, user_id: int, since: str = None, collections=None):
+    """Rows written and ids deleted in each collection since the versions in ``since``.
+
+    Without a token (or for a collection missing from it) every row is
+    returned. A token older than the pruned tombstones can't be replayed
+    either, so that collection is sent whole with ``reset`` set. The new
+    token holds the versions read before any rows, so a write racing with
+    this call is sent again next time rather than lost.
+    """
+    last_seen = decode_sync_token(since) if since else {}
+    collections = list(collections or SYNC_COLLECTIONS)
+    versions, pruned = {}, {}
+    for collection, version, pruned_version in db.execute(
+        select(models.CollectionVersion.collection, models.CollectionVersion.version, models.CollectionVersion.pruned_version)
+        .where(models.CollectionVersion.user_id == user_id, models.CollectionVersion.collection.in_(collections))
+    ):
+        versions[collection], pruned[collection] = version, pruned_version
+    changes = {}
+    for collection in collections:
+        model = SYNC_COLLECTIONS[collection]
+        last = last_seen.get(collection)
+        reset = last is not None and last < pruned.get(collection, 0)
+        if reset:
+            last = None
+        elif last is not None and last >= versions.get(collection, 0):
+            changes[collection] = {"upserted": [], "deleted": [], "reset": False}
+            continue
+        query = db.query(model).filter(model.user_id == user_id)
+        deleted = []
+        if last is not None:
+            query = query.filter(model.row_version > last)
+            deleted = db.scalars(
+                select(models.Tombstone.ref_id).where(
+                    models.Tombstone.user_id == user_id,
+                    models.Tombstone.collection == collection,
+                    models.Tombstone.row_version > last,
+                )
+            ).all()
+        upserted = query.order_by(model.row_version, model.id).all()
+        # SQLite can reuse the id of a deleted row; the live row wins.
+        live = {obj.id for obj in upserted}
+        changes[collection] = {"upserted": upserted, "deleted": [i for i in dict.fromkeys(deleted) if i not in live], "reset": reset}
+    token = encode_sync_token({collection: versions.get(collection, 0) for collection in collections})
+    return dict(changes, token=token)
+
+# Search
+def search_documents(db: Session, user_id: int, q: str, kind: str = None, limit: int = 20):
+    return search.search(db, user_id, q, kind=kind, limit=limit)
+
 # Stats
+def _count_where(db: Session, condition):
+    # COUNT(*) FILTER (WHERE ...) where supported, portable SUM(CASE ...) otherwise.
+    if db.bind.dialect.name == "postgresql":
+        return func.count().filter(condition)
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+STATS_COUNTERS = ("pending_tasks", "notes_count", "study_minutes", "study_sessions_count")
+
+def _aggregate_columns(db: Session, user_id: int):
+    # One scalar subquery per counter, in STATS_COUNTERS order.
+    pending_tasks = (
+        select(_count_where(db, models.Task.is_completed == False))
+        .where(models.Task.user_id == user_id)
+        .scalar_subquery()
+    )
+    notes_count = select(func.count()).where(models.Note.user_id == user_id).scalar_subquery()
+    study_minutes = (
+        select(func.coalesce(func.sum(models.StudySession.duration_minutes), 0))
+        .where(models.StudySession.user_id == user_id)
+        .scalar_subquery()
+    )
+    study_sessions_count = (
+        select(func.count()).where(models.StudySession.user_id == user_id).scalar_subquery()
+    )
+    return [pending_tasks, notes_count, study_minutes, study_sessions_count]
+
+def aggregate_stats(db: Session, user_id: int):
+    row = db.execute(select(*_aggregate_columns(db, user_id))).one()
+    return {name: value or 0 for name, value in zip(STATS_COUNTERS, row)}
+
+def _insert_stats(db: Session, user_id: int, deltas=None):
+    """Create the user_stats row from the aggregate in a single INSERT ... SELECT.
+
+    If the row already exists the insert is skipped, or with ``deltas``
+    they are added to it instead. Returns False where the dialect has no
+    ON CONFLICT.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        return False
+    table = models.UserStats.__table__
+    upsert = (postgresql.insert(table) if dialect == "postgresql" else sqlite.insert(table)).from_select(
+        ["user_id", *STATS_COUNTERS], select(literal(user_id), *_aggregate_columns(db, user_id)),
+    )
+    if deltas:
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[table.c.user_id], set_={key: table.c[key] + delta for key, delta in deltas.items()},
+        )
+    else:
+        upsert = upsert.on_conflict_do_nothing(index_elements=[table.c.user_id])
+    db.execute(upsert)
+    return True
+
+def bump_stats(db: Session, user_id: int, **deltas):
+    """Apply counter deltas to the user's materialized stats row.
+
+    Runs inside the caller's transaction. With MATERIALIZED_STATS on, a
+    missing row is created from the aggregate, which already includes the
+    caller's write. If a concurrent first read backfilled it meanwhile,
+    the delta is added to that row instead, so no write goes uncounted.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    values = {getattr(models.UserStats, key): getattr(models.UserStats, key) + delta for key, delta in deltas.items()}
+    updated = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).update(values, synchronize_session=False)
+    if not updated and MATERIALIZED_STATS:
+        db.flush()
+        _insert_stats(db, user_id, deltas)
+
+def _materialized_stats(db: Session, user_id: int):
+    db_stats = db.get(models.UserStats, user_id)
+    if db_stats is None:
+        if _insert_stats(db, user_id):
+            db.commit()
+            db_stats = db.get(models.UserStats, user_id)
+        else:
+            db_stats = models.UserStats(user_id=user_id, **aggregate_stats(db, user_id))
+            db.add(db_stats)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another request backfilled the row first.
+                db.rollback()
+                db_stats = db.get(models.UserStats, user_id)
+    return {name: getattr(db_stats, name) for name in STATS_COUNTERS}
+
+def focus_score(study_minutes: int, study_sessions_count: int):
+    if not study_sessions_count:
+        return 0
+    average_minutes = study_minutes / study_sessions_count
+    return min(100, round(100 * average_minutes / FOCUS_TARGET_MINUTES))
+
 def get_stats(db: Session, user_id: int):
-    pending_tasks = db.query(models.Task).filter(models.Task.user_id == user_id, models.Task.is_completed == False).count()
-    notes_count = db.query(models.Note).filter(models.Note.user_id == user_id).count()
-    
-    # Calculate total study hours
-    study_sessions = db.query(models.StudySession).filter(models.StudySession.user_id == user_id).all()
-    total_minutes = sum([s.duration_minutes for s in study_sessions])
-    study_hours = round(total_minutes / 60, 1)
-    
+    counters = _materialized_stats(db, user_id) if MATERIALIZED_STATS else aggregate_stats(db, user_id)
+    return {
+        "pending_tasks": counters["pending_tasks"],
+        "notes_created": counters["notes_count"],
+        "study_hours": round(counters["study_minutes"] / 60, 1),
+        "focus_score": f"{focus_score(counters['study_minutes'], counters['study_sessions_count'])}%",
+    }
+
+# Study rollups
+ROLLUP_BUCKETS = ("day", "week", "month")
+
+def _daily_delta(session, sign: int):
+    # (day, subject, minutes, sessions) contribution of one session, from a row or a dict of its columns.
+    if not isinstance(session, dict):
+        session = {"date": session.date, "subject": session.subject, "duration_minutes": session.duration_minutes}
+    return session["date"], session["subject"] or "", sign * (session["duration_minutes"] or 0), sign
+
+def bump_study_daily(db: Session, user_id: int, deltas):
+    """Apply ``(day, subject, minutes, sessions)`` deltas to study_daily inside the caller's transaction."""
+    totals = {}
+    for day, subject, minutes, sessions in deltas:
+        if day is None:
+            continue
+        entry = totals.setdefault((day, subject), [0, 0])
+        entry[0] += minutes
+        entry[1] += sessions
+    rows = [
+        {"user_id": user_id, "day": day, "subject": subject, "minutes": minutes, "sessions": sessions}
+        for (day, subject), (minutes, sessions) in totals.items() if minutes or sessions
+    ]
+    if not rows:
+        return
+    table = models.StudyDaily.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert(table) if dialect == "postgresql" else sqlite.insert(table)
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.subject],
+            set_={"minutes": table.c.minutes + upsert.excluded.minutes,
+                  "sessions": table.c.sessions + upsert.excluded.sessions},
+        ), rows)
+        return
+    for row in rows:
+        key = (table.c.user_id == user_id, table.c.day == row["day"], table.c.subject == row["subject"])
+        updated = db.execute(update(table).where(*key).values(
+            minutes=table.c.minutes + row["minutes"], sessions=table.c.sessions + row["sessions"]
+        ))
+        if updated.rowcount == 0:
+            db.execute(insert(table).values(**row))
+
+def _date_bucket(db: Session, column, bucket: str):
+    # SQL expression truncating a DATE column to the bucket start (weeks start on Monday),
+    # or None when the dialect has no suitable function.
+    if bucket == "day":
+        return column
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return cast(func.date_trunc(bucket, column), Date)
+    if dialect == "sqlite":
+        if bucket == "week":
+            return func.date(column, "weekday 0", "-6 days", type_=Date)
+        return func.date(column, "start of month", type_=Date)
+    return None
+
+def _python_bucket(day: date, bucket: str):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def get_study_rollup(db: Session, user_id: int, bucket: str = "day", start: date = None, end: date = None, group_by: str = None):
+    """Study minutes and session counts per bucket (and subject), over ``[start, end]``.
+
+    Groups the study_daily rollup when STUDY_DAILY_ROLLUP is on, so the
+    cost follows the number of days rather than sessions; otherwise the
+    sessions themselves via the (user_id, date) index.
+    """
+    if STUDY_DAILY_ROLLUP:
+        model = models.StudyDaily
+        day_column, subject_column = model.day, model.subject
+        minutes, sessions = func.sum(model.minutes), func.sum(model.sessions)
+        conditions = [model.user_id == user_id, model.sessions > 0]
+    else:
+        model = models.StudySession
+        day_column, subject_column = model.date, model.subject
+        minutes, sessions = func.sum(model.duration_minutes), func.count()
+        conditions = [model.user_id == user_id, day_column.isnot(None)]
+    if start is not None:
+        conditions.append(day_column >= start)
+    if end is not None:
+        conditions.append(day_column <= end)
+    bucket_column = _date_bucket(db, day_column, bucket)
+    python_bucket = bucket_column is None
+    if python_bucket:
+        bucket_column = day_column
+    keys = [bucket_column.label("bucket")]
+    if group_by == "subject":
+        keys.append(subject_column.label("subject"))
+    rows = db.execute(
+        select(*keys, minutes.label("minutes"), sessions.label("sessions"))
+        .where(*conditions)
+        .group_by(*keys)
+        .order_by(*keys)
+    ).all()
+    totals = {}
+    for row in rows:
+        key = (_python_bucket(row.bucket, bucket) if python_bucket else row.bucket,)
+        if group_by == "subject":
+            key += (row.subject,)
+        entry = totals.setdefault(key, [0, 0])
+        entry[0] += row.minutes or 0
+        entry[1] += row.sessions or 0
+    items = []
+    for key, (bucket_minutes, bucket_sessions) in sorted(totals.items()):
+        item = {"bucket": key[0], "minutes": bucket_minutes, "sessions": bucket_sessions}
+        if group_by == "subject":
+            item["subject"] = key[1]
+        items.append(item)
     return {
-        "pending_tasks": pending_tasks,
-        "notes_created": notes_count,
-        "study_hours": study_hours,
-        "focus_score": "85%" # Placeholder logic for now
+        "bucket": bucket,
+        "items": items,
+        "total_minutes": sum(item["minutes"] for item in items),
+        "total_sessions": sum(item["sessions"] for item in items),
     }
+
+# Export and import
+EXPORT_FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+# type -> (model, export schema, import schema, batch insert). Projects come
+# first so imported tasks can be pointed at the projects' new ids.
+PORTABLE_TYPES = {
+    "project": (models.Project, schemas.ProjectRow, schemas.ProjectCreate, insert_projects),
+    "task": (models.Task, schemas.Task, schemas.TaskCreate, insert_tasks),
+    "note": (models.Note, schemas.Note, schemas.NoteCreate, insert_notes),
+    "resource": (models.Resource, schemas.Resource, schemas.ResourceCreate, insert_resources),
+    "grade": (models.Grade, schemas.Grade, schemas.GradeCreate, insert_grades),
+    "event": (models.Event, schemas.Event, schemas.EventCreate, insert_events),
+    "study_session": (models.StudySession, schemas.StudySession, schemas.StudySessionCreate, insert_study_sessions),
+}
+
+def export_batches(db: Session, user_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield ``(type, rows)`` batches covering every collection of the user.
+
+    Each collection is read with yield_per (a server-side cursor where the
+    driver supports one), so memory stays bounded by one batch however
+    large the account is.
+    """
+    for kind, (model, schema, _, _) in PORTABLE_TYPES.items():
+        columns = [getattr(model, name) for name in schema.model_fields]
+        result = db.execute(
+            select(*columns).where(model.user_id == user_id).order_by(model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield kind, [row._asdict() for row in partition]
+
+class Importer:
+    """Validates NDJSON export lines and inserts them in batches.
+
+    Every batch goes through the same insert_* helpers as the bulk
+    endpoints (search index, tags, stats and versions included) on the
+    caller's session; the caller commits once the whole stream has been
+    consumed, so an import lands atomically. Invalid lines are skipped and
+    reported by line number.
+    """
+
+    def __init__(self, user_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.lines = 0
+        self.pending = {kind: [] for kind in PORTABLE_TYPES}
+        self.imported = {kind: 0 for kind in PORTABLE_TYPES}
+        self.project_ids = {}  # exported project id -> new id
+        self.errors = []
+        self.error_count = 0
+        self.warnings = []
+
+    def _error(self, line: int, detail: str):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def add_line(self, raw):
+        self.lines += 1
+        if not raw.strip():
+            return
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return self._error(self.lines, "Invalid JSON")
+        if not isinstance(entry, dict):
+            return self._error(self.lines, "Expected an object with 'type' and 'data'")
+        kind = entry.get("type")
+        if kind == "header":
+            if entry.get("version") != EXPORT_FORMAT_VERSION:
+                self._error(self.lines, f"Unsupported export version {entry.get('version')!r}")
+            return
+        if kind not in PORTABLE_TYPES or not isinstance(entry.get("data"), dict):
+            return self._error(self.lines, f"Unknown type {kind!r}" if kind not in PORTABLE_TYPES else "Missing 'data' object")
+        try:
+            values = PORTABLE_TYPES[kind][2](**entry["data"]).dict()
+            if kind == "event":
+                values["recurrence"] = recurrence.normalize_rule(values["recurrence"])
+                recurrence.series_end(recurrence.to_utc(values["start_time"]), recurrence.to_utc(values["end_time"]), values["recurrence"])
+        except ValidationError as exc:
+            return self._error(self.lines, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            ))
+        except recurrence.InvalidRecurrence as exc:
+            return self._error(self.lines, str(exc))
+        self.pending[kind].append((self.lines, entry["data"].get("id"), values))
+
+    def ready(self):
+        return any(len(items) >= self.batch_size for items in self.pending.values())
+
+    def flush(self, db: Session):
+        # Everything pending goes in, in PORTABLE_TYPES order, so projects always precede their tasks.
+        for kind, items in self.pending.items():
+            if not items:
+                continue
+            if kind == "task":
+                for line, _, values in items:
+                    old_project_id = values.get("project_id")
+                    if old_project_id is not None:
+                        values["project_id"] = self.project_ids.get(old_project_id)
+                        if values["project_id"] is None:
+                            self.warnings.append({"line": line, "detail": f"Unknown project_id {old_project_id}; imported without a project"})
+            created = PORTABLE_TYPES[kind][3](db, [values for _, _, values in items], self.user_id)
+            if kind == "project":
+                self.project_ids.update((old_id, obj.id) for (_, old_id, _), obj in zip(items, created) if old_id is not None)
+            self.imported[kind] += len(created)
+            self.pending[kind] = []
+        logger.info("Import progress", extra={"user_id": self.user_id, "lines": self.lines, "imported": sum(self.imported.values())})
+
+    def report(self):
+        return {
+            "lines": self.lines,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "warnings": self.warnings[:IMPORT_MAX_REPORTED_ERRORS],
+        }
+
+# Bootstrap
+def get_upcoming_tasks(db: Session, user_id: int, limit: int = 10):
+    # Pending tasks, soonest (including overdue) first; undated ones last.
+    return (
+        db.query(models.Task)
+        .filter(models.Task.user_id == user_id, models.Task.is_completed == False)
+        .order_by(models.Task.due_date.is_(None), models.Task.due_date, models.Task.id)
+        .limit(limit)
+        .all()
+    )
+
+def get_recent_notes(db: Session, user_id: int, limit: int = 5):
+    return (
+        db.query(models.Note)
+        .filter(models.Note.user_id == user_id)
+        .order_by(models.Note.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+def get_week_study_sessions(db: Session, user_id: int, today: date = None):
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    return (
+        db.query(models.StudySession)
+        .filter(
+            models.StudySession.user_id == user_id,
+            models.StudySession.date >= week_start,
+            models.StudySession.date < week_start + timedelta(days=7),
+        )
+        .order_by(models.StudySession.date, models.StudySession.id)
+        .all()
+    )
+
+# Independent first-paint queries served by /bootstrap, by response field.
+BOOTSTRAP_LOADERS = {
+    "stats": get_stats,
+    "upcoming_tasks": get_upcoming_tasks,
+    "recent_notes": get_recent_notes,
+    "week_study_sessions": get_week_study_sessions,
+}
+
+def get_bootstrap(db: Session, user_id: int, sections=None):
+    return {name: BOOTSTRAP_LOADERS[name](db, user_id) for name in sections or BOOTSTRAP_LOADERS}
@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -17,10 +24,245 @@ if not SQLALCHEMY_DATABASE_URL:
     SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
     print("Warning: DATABASE_URL not found, using SQLite fallback.")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def env_flag(name: str, default: str):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Connection pool tuning (per worker process).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+SQLITE_WAL = env_flag("SQLITE_WAL", "true")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Statements slower than this are logged and kept for /metrics and /internal/slow-queries.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 100))
+# Distinct slow statements exported as /metrics series (bounds label cardinality).
+SLOW_QUERY_STATEMENTS = int(os.getenv("SLOW_QUERY_STATEMENTS", 50))
+
+logger = logging.getLogger("smartbrain.db")
+
+# Pool metrics
+class PoolMetrics:
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def record_wait(self, seconds: float):
+        wait_ms = seconds * 1000
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            for i, bound in enumerate(self.BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["le_inf"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_histogram": dict(zip(labels, self.wait_buckets)),
+            }
+
+class TimedCheckoutMixin:
+    # Times how long a checkout waits for a free connection.
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+class InstrumentedQueuePool(TimedCheckoutMixin, QueuePool):
+    metrics = PoolMetrics()
+
+class InstrumentedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+def is_memory_sqlite(url: str):
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+def engine_options(url: str, pool_class):
+    if is_memory_sqlite(url):
+        # In-memory SQLite keeps SQLAlchemy's default single-connection pool.
+        return {}
+    options = {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.startswith("sqlite:"):
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+def configure_sqlite(sync_engine):
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+def pool_status(engine_to_inspect):
+    pool = engine_to_inspect.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "timeout_seconds": DB_POOL_TIMEOUT,
+        })
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+# Query metrics
+class RequestQueryStats:
+    """Statements executed on behalf of one HTTP request (see middleware.MetricsMiddleware)."""
+
+    def __init__(self, route: str = None):
+        self.route = route
+        self.queries = 0
+        self.seconds = 0.0
+
+# Set by the metrics middleware for the duration of a request. The threadpool
+# (sync sessions) and run_sync greenlets (async sessions) inherit it.
+request_query_stats = ContextVar("request_query_stats", default=None)
+
+class QueryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.seconds_total = 0.0
+        self.slow_queries = 0
+        self.recent_slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self.slow_statements = OrderedDict()  # statement -> [count, total seconds, max seconds]
+
+    def record(self, statement: str, seconds: float):
+        stats = request_query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += seconds
+        slow = seconds * 1000 >= SLOW_QUERY_MS
+        with self._lock:
+            self.queries += 1
+            self.seconds_total += seconds
+            if not slow:
+                return
+            self.slow_queries += 1
+            route = stats.route if stats is not None else None
+            self.recent_slow.append({
+                "statement": statement,
+                "duration_ms": round(seconds * 1000, 2),
+                "route": route,
+                "at": time.time(),
+            })
+            entry = self.slow_statements.pop(statement, None) or [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            self.slow_statements[statement] = entry
+            while len(self.slow_statements) > SLOW_QUERY_STATEMENTS:
+                self.slow_statements.popitem(last=False)
+        logger.warning("Slow query (%.1f ms) on %s: %s", seconds * 1000, route, statement,
+                       extra={"duration_ms": round(seconds * 1000, 2), "route": route})
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "seconds_total": self.seconds_total,
+                "slow_queries": self.slow_queries,
+                "slow_statements": {statement: tuple(entry) for statement, entry in self.slow_statements.items()},
+            }
+
+    def slow_log(self):
+        with self._lock:
+            return list(reversed(self.recent_slow))
+
+query_metrics = QueryMetrics()
+
+def instrument_queries(sync_engine):
+    # Times each cursor execution; an executemany counts as one statement. The
+    # start is kept on the execution context, so a failed statement leaves nothing behind.
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        query_metrics.record(statement, time.perf_counter() - context.query_start)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, InstrumentedQueuePool))
+if engine.dialect.name == "sqlite" and not is_memory_sqlite(SQLALCHEMY_DATABASE_URL):
+    configure_sqlite(engine)
+instrument_queries(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Opt-in asyncio engine (asyncpg / aiosqlite). Routes then await queries on
+# the event loop instead of tying up a threadpool worker per request.
+USE_ASYNC_DB = env_flag("USE_ASYNC_DB", "false")
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(url: str):
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool))
+    if async_engine.dialect.name == "sqlite" and not is_memory_sqlite(ASYNC_DATABASE_URL):
+        configure_sqlite(async_engine.sync_engine)
+    instrument_queries(async_engine.sync_engine)
+    # expire_on_commit=False: returned rows are serialized after commit and
+    # must not trigger implicit (blocking) refreshes.
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
 def get_db():
@@ -30,3 +272,17 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_status():
+    status = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine)
+    return status
+
+# Dependency used by the API routes: an AsyncSession when USE_ASYNC_DB is
+# set, a regular Session otherwise. async_crud accepts either.
+get_session = get_async_db if USE_ASYNC_DB else get_db
+
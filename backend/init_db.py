@@ -1,16 +1,16 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from database import Base, engine
-import models, auth, crud, schemas
+import models, auth, crud, schemas, migrations
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def init_db():
-    print("Creating tables...")
-    Base.metadata.create_all(bind=engine)
-    print("Tables created.")
+    print("Applying migrations...")
+    migrations.upgrade(engine)
+    print("Migrations applied.")
 
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
@@ -34,8 +34,7 @@ def init_db():
                 print("Password verification FAILED.")
                 # Update password
                 print("Updating password...")
-                user.hashed_password = auth.get_password_hash(password)
-                db.commit()
+                crud.update_user_password(db, user, password)
                 print("Password updated.")
 
     except Exception as e:
@@ -0,0 +1,111 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from pathlib import Path
+import json
+import logging
+import os
+import queue
+import sys
+from dotenv import load_dotenv
+
+BASE_DIR = Path(__file__).resolve().parent
+
+load_dotenv(BASE_DIR / ".env")
+
+APP_LOGGER = "smartbrain"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # level of the smartbrain.* loggers
+# Per-logger overrides, e.g. "sqlalchemy.engine=INFO,smartbrain.crud=DEBUG".
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_FILE = os.getenv("LOG_FILE", str(BASE_DIR / "backend.log"))  # empty disables the file handler
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size")  # size or time
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Correlation id of the request being handled; set by middleware.RequestContextMiddleware.
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    # Never block a request on logging: drop records when the queue is full.
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def _formatter():
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+def _file_handler():
+    if LOG_ROTATE == "time":
+        return TimedRotatingFileHandler(LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    return RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+
+_listener = None
+_queue_handler = None
+
+def setup_logging():
+    """Route application logs through a queue drained by a background thread.
+
+    Request handlers only enqueue records; formatting and file I/O (with
+    size- or time-based rotation) happen on the listener thread.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+    formatter = _formatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(_file_handler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+
+    # Third-party loggers stay at WARNING unless overridden in LOG_LEVELS.
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(_queue_handler)
+    logging.getLogger(APP_LOGGER).setLevel(LOG_LEVEL)
+    for override in filter(None, LOG_LEVELS.split(",")):
+        name, _, level = override.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
@@ -1,16 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import timedelta
-from jose import JWTError, jwt
-import models, schemas, crud, database, auth
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta
+from contextlib import asynccontextmanager
+from jose import JWTError
+import asyncio
+import hashlib
+import hmac
+import os
+import models, schemas, crud, async_crud, database, analytics, auth, changefeed, metrics, migrations, recurrence, responses, search, tagging
+import logging_config
+import middleware
+from middleware import CompressionMiddleware, MetricsMiddleware, RequestContextMiddleware
 from database import engine
 
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Student Second Brain API")
+# Apply pending schema migrations on startup; disable to run `python migrations.py` out of band.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+# Largest ?limit= the paginated list endpoints accept.
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Widest window /calendar will expand recurring events over.
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", 400))
+# Serve list endpoints from column selects encoded straight to JSON (see responses.py).
+FAST_LISTS = database.env_flag("FAST_LISTS", "false")
+# Load /bootstrap sections in parallel, one pooled connection each. SQLite
+# serializes access anyway, so there it defaults to a single session.
+BOOTSTRAP_CONCURRENT = database.env_flag("BOOTSTRAP_CONCURRENT", "false" if engine.dialect.name == "sqlite" else "true")
+# Bearer token required to scrape /metrics; unset leaves it open (e.g. behind an internal network).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Comment lines sent on idle /events/stream connections so proxies keep them open.
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging_config.setup_logging()
+    if AUTO_MIGRATE:
+        migrations.upgrade(engine)
+    yield
+    auth.password_executor.shutdown()
+    logging_config.shutdown_logging()
+
+app = FastAPI(title="Student Second Brain API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -20,10 +53,106 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 # Dependency
-get_db = database.get_db
+get_db = database.get_session
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+@app.exception_handler(crud.InvalidCursor)
+@app.exception_handler(crud.InvalidSyncToken)
+@app.exception_handler(recurrence.InvalidRecurrence)
+async def invalid_token_handler(request: Request, exc: ValueError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(auth.PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: auth.PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+def page_response(items, next_cursor, cursor: Optional[str]):
+    # Without ?cursor= the legacy offset mode keeps returning a bare list.
+    if cursor is None:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
+
+async def list_etag(request: Request, db, user_id: int, collection: str, suffix: str = ""):
+    # Strong ETag from the collection's version counter plus the query string,
+    # so each page/filter combination validates independently. The version is
+    # read before any rows, so a concurrent write can only make it stale (a
+    # spurious refetch), never wrongly fresh.
+    version = await async_crud.get_collection_version(db, user_id, collection)
+    query = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    return f'"{collection}-{user_id}-{version}-{query}{suffix}"'
+
+def fast_columns(model, schema):
+    return responses.schema_columns(model, schema) if FAST_LISTS else None
+
+def list_response(response: Response, items, next_cursor, cursor: Optional[str]):
+    # On the fast path the rows are column tuples already typed by the DB:
+    # encode them directly instead of validating them through response_model.
+    if not FAST_LISTS:
+        return page_response(items, next_cursor, cursor)
+    return responses.FastJSONResponse(
+        page_response(responses.rows_to_dicts(items), next_cursor, cursor), headers=dict(response.headers)
+    )
+
+def parse_names(value: str, allowed, param: str):
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if any(name not in allowed for name in names):
+        raise HTTPException(status_code=400, detail=f"{param} must be among: {', '.join(allowed)}")
+    return names
+
+def not_modified(request: Request, response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    # Weak comparison: compressed responses carry the tag as W/"...".
+    candidates = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=dict(response.headers))
+    # A full load of a representation compressed before is answered from the
+    # cache, without running the route's query.
+    cached = middleware.cached_body(request.headers, request.method, request.url.path, etag)
+    if cached is not None:
+        encoding, body = cached
+        headers = dict(response.headers)
+        headers["etag"] = f"W/{etag}"
+        headers["content-encoding"] = encoding
+        headers["vary"] = "Accept-Encoding, Authorization" if "authorization" in request.headers else "Accept-Encoding"
+        return Response(body, media_type="application/json", headers=headers)
+    return None
+
+async def sync_revocations(db):
+    # Folds in tokens revoked by other workers; at most one query per REVOCATION_SYNC_SECONDS.
+    revoked = auth.revoked_tokens
+    if not revoked.sync_due():
+        return
+    started = datetime.utcnow()
+    if revoked.apply(await async_crud.get_revocations(db, revoked.synced_through), started):
+        return
+    # Over capacity: rebuild at twice the size from the unexpired revocations.
+    revoked.begin_rebuild()
+    try:
+        rows = await async_crud.get_revocations(db)
+    except BaseException:
+        revoked.cancel_rebuild()
+        raise
+    revoked.rebuild(revoked.capacity * 2, rows)
+
+async def is_revoked(db, payload: dict):
+    jti = payload.get("jti")
+    # Tokens issued before revocation existed have no jti and cannot be revoked individually.
+    return jti is not None and auth.revoked_tokens.might_contain(jti) and await async_crud.is_token_revoked(db, jti)
+
+async def revoke(db, payload: dict, user_id: Optional[int] = None):
+    jti = payload.get("jti")
+    if jti is None:
+        return False
+    auth.revoked_tokens.add(jti)
+    auth.principal_cache.revoke(jti)
+    return await async_crud.revoke_token(db, jti, datetime.utcfromtimestamp(payload["exp"]), user_id=user_id)
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
@@ -31,18 +160,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    await sync_revocations(db)
+    principal = auth.principal_cache.get(token)
+    if principal is not None:
+        return principal
     try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        payload = auth.decode_token(token)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=token_data.email)
+    if await is_revoked(db, payload):
+        raise credentials_exception
+    user = await async_crud.get_user_by_email(db, email=payload["sub"])
     if user is None:
         raise credentials_exception
-    return user
+    principal = schemas.User(id=user.id, email=user.email)
+    auth.principal_cache.set(token, user.email, principal, exp=payload.get("exp"), jti=payload.get("jti"))
+    return principal
 
 @app.get("/")
 def read_root():
@@ -51,145 +184,424 @@ def read_root():
 # Auth
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await async_crud.get_user_by_email(db, form_data.username)
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return auth.create_token_pair(user.email)
+
+@app.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(request: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    invalid = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        payload = auth.decode_token(request.refresh_token, token_type="refresh")
+    except JWTError:
+        raise invalid
+    user = await async_crud.get_user_by_email(db, email=payload["sub"])
+    # Refresh tokens are single use: revoking it atomically also rejects a replay.
+    if user is None or not await revoke(db, payload, user_id=user.id):
+        raise invalid
+    return auth.create_token_pair(user.email)
+
+@app.post("/logout", status_code=204)
+async def logout(request: Optional[schemas.LogoutRequest] = None, token: str = Depends(oauth2_scheme),
+                 db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    payload = auth.decode_token(token)
+    await revoke(db, payload, user_id=current_user.id)
+    if request is not None and request.refresh_token:
+        try:
+            refresh = auth.decode_token(request.refresh_token, token_type="refresh")
+        except JWTError:
+            refresh = None
+        if refresh is not None and refresh["sub"] == current_user.email:
+            await revoke(db, refresh, user_id=current_user.id)
+    return Response(status_code=204)
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await async_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    hashed_password = await auth.get_password_hash_async(user.password)
+    return await async_crud.create_user(db=db, user=user, hashed_password=hashed_password)
 
 @app.get("/users/me/", response_model=schemas.User)
 async def read_users_me(current_user: schemas.User = Depends(get_current_user)):
     return current_user
 
+# Operational endpoints
+def has_operator_token(request: Request):
+    return hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+def require_operator(request: Request):
+    # /internal/* exposes process-wide stats, so unlike /metrics it stays closed without METRICS_TOKEN.
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Internal endpoints are disabled; set METRICS_TOKEN")
+    if not has_operator_token(request):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/internal/auth-cache", dependencies=[Depends(require_operator)])
+def read_auth_cache_stats():
+    return auth.principal_cache.stats()
+
+@app.get("/internal/revoked-tokens", dependencies=[Depends(require_operator)])
+def read_revocation_filter_stats():
+    return auth.revoked_tokens.stats()
+
+@app.get("/internal/password-hasher", dependencies=[Depends(require_operator)])
+def read_password_hasher_stats():
+    return auth.password_executor.stats()
+
+@app.get("/internal/grade-summary-cache", dependencies=[Depends(require_operator)])
+def read_grade_summary_cache_stats():
+    return analytics.grade_summary_cache.stats()
+
+@app.get("/internal/compression-cache", dependencies=[Depends(require_operator)])
+def read_compression_cache_stats():
+    return middleware.compressed_cache.stats()
+
+@app.get("/internal/pool", dependencies=[Depends(require_operator)])
+def read_pool_stats():
+    return database.get_pool_status()
+
+@app.get("/internal/slow-queries", dependencies=[Depends(require_operator)])
+def read_slow_queries():
+    return database.query_metrics.slow_log()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics(request: Request):
+    if METRICS_TOKEN and not has_operator_token(request):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Tasks
 @app.post("/tasks/", response_model=schemas.Task)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_task(db=db, task=task, user_id=current_user.id)
+async def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_task(db=db, task=task, user_id=current_user.id)
+
+@app.get("/tasks/", response_model=Union[List[schemas.Task], schemas.TaskPage])
+async def read_tasks(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, tag: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "tasks")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_tasks(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, tag=tag, columns=fast_columns(models.Task, schemas.Task))
+    return list_response(response, items, next_cursor, cursor)
 
-@app.get("/tasks/", response_model=List[schemas.Task])
-def read_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_tasks(db, user_id=current_user.id, skip=skip, limit=limit)
+@app.post("/tasks/bulk", response_model=List[schemas.Task])
+async def create_tasks_bulk(tasks: List[schemas.TaskCreate], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.bulk_create_tasks(db, tasks, user_id=current_user.id)
+
+@app.patch("/tasks/bulk", response_model=schemas.BulkResult)
+async def update_tasks_bulk(patches: List[schemas.TaskPatch], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_update_tasks(db, patches, user_id=current_user.id)}
+
+@app.delete("/tasks/bulk", response_model=schemas.BulkResult)
+async def delete_tasks_bulk(request: schemas.BulkDelete, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_delete_tasks(db, request.ids, user_id=current_user.id)}
 
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
-def update_task(task_id: int, task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_task = crud.update_task(db, task_id=task_id, task=task, user_id=current_user.id)
+async def update_task(task_id: int, task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_task = await async_crud.update_task(db, task_id=task_id, task=task, user_id=current_user.id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
 @app.delete("/tasks/{task_id}", response_model=schemas.Task)
-def delete_task(task_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_task = crud.delete_task(db, task_id=task_id, user_id=current_user.id)
+async def delete_task(task_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_task = await async_crud.delete_task(db, task_id=task_id, user_id=current_user.id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
 # Notes
 @app.post("/notes/", response_model=schemas.Note)
-def create_note(note: schemas.NoteCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_note(db=db, note=note, user_id=current_user.id)
+async def create_note(note: schemas.NoteCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_note(db=db, note=note, user_id=current_user.id)
+
+@app.get("/notes/", response_model=Union[List[schemas.Note], schemas.NotePage])
+async def read_notes(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, tag: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "notes")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_notes(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, tag=tag, columns=fast_columns(models.Note, schemas.Note))
+    return list_response(response, items, next_cursor, cursor)
+
+@app.post("/notes/bulk", response_model=List[schemas.Note])
+async def create_notes_bulk(notes: List[schemas.NoteCreate], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.bulk_create_notes(db, notes, user_id=current_user.id)
 
-@app.get("/notes/", response_model=List[schemas.Note])
-def read_notes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_notes(db, user_id=current_user.id, skip=skip, limit=limit)
+@app.patch("/notes/bulk", response_model=schemas.BulkResult)
+async def update_notes_bulk(patches: List[schemas.NotePatch], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_update_notes(db, patches, user_id=current_user.id)}
+
+@app.delete("/notes/bulk", response_model=schemas.BulkResult)
+async def delete_notes_bulk(request: schemas.BulkDelete, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_delete_notes(db, request.ids, user_id=current_user.id)}
 
 @app.put("/notes/{note_id}", response_model=schemas.Note)
-def update_note(note_id: int, note: schemas.NoteCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_note = crud.update_note(db, note_id=note_id, note=note, user_id=current_user.id)
+async def update_note(note_id: int, note: schemas.NoteCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_note = await async_crud.update_note(db, note_id=note_id, note=note, user_id=current_user.id)
     if db_note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     return db_note
 
 @app.delete("/notes/{note_id}", response_model=schemas.Note)
-def delete_note(note_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_note = crud.delete_note(db, note_id=note_id, user_id=current_user.id)
+async def delete_note(note_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_note = await async_crud.delete_note(db, note_id=note_id, user_id=current_user.id)
     if db_note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     return db_note
 
 # Resources
 @app.post("/resources/", response_model=schemas.Resource)
-def create_resource(resource: schemas.ResourceCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_resource(db=db, resource=resource, user_id=current_user.id)
+async def create_resource(resource: schemas.ResourceCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_resource(db=db, resource=resource, user_id=current_user.id)
 
-@app.get("/resources/", response_model=List[schemas.Resource])
-def read_resources(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_resources(db, user_id=current_user.id, skip=skip, limit=limit)
+@app.get("/resources/", response_model=Union[List[schemas.Resource], schemas.ResourcePage])
+async def read_resources(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, tag: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "resources")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_resources(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, tag=tag, columns=fast_columns(models.Resource, schemas.Resource))
+    return list_response(response, items, next_cursor, cursor)
 
 @app.delete("/resources/{resource_id}", response_model=schemas.Resource)
-def delete_resource(resource_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_resource = crud.delete_resource(db, resource_id=resource_id, user_id=current_user.id)
+async def delete_resource(resource_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_resource = await async_crud.delete_resource(db, resource_id=resource_id, user_id=current_user.id)
     if db_resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
     return db_resource
 
 # Projects
 @app.post("/projects/", response_model=schemas.Project)
-def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_project(db=db, project=project, user_id=current_user.id)
-
-@app.get("/projects/", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_projects(db, user_id=current_user.id, skip=skip, limit=limit)
+async def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_project(db=db, project=project, user_id=current_user.id)
+
+@app.get("/projects/", response_model=Union[List[schemas.Project], schemas.ProjectPage])
+async def read_projects(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, include: str = "", db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    include_tasks = "tasks" in parse_names(include, ("tasks",), "include")
+    # Task writes bump the projects version; the day is part of the tag because
+    # the overdue counts change at midnight without any write.
+    etag = await list_etag(request, db, current_user.id, "projects", suffix=f"-{date.today()}")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_projects(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, include_tasks=include_tasks)
+    return page_response(items, next_cursor, cursor)
 
 # Grades
 @app.post("/grades/", response_model=schemas.Grade)
-def create_grade(grade: schemas.GradeCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_grade(db=db, grade=grade, user_id=current_user.id)
-
-@app.get("/grades/", response_model=List[schemas.Grade])
-def read_grades(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_grades(db, user_id=current_user.id, skip=skip, limit=limit)
+async def create_grade(grade: schemas.GradeCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_grade(db=db, grade=grade, user_id=current_user.id)
+
+@app.get("/grades/", response_model=Union[List[schemas.Grade], schemas.GradePage])
+async def read_grades(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "grades")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_grades(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, columns=fast_columns(models.Grade, schemas.Grade))
+    return list_response(response, items, next_cursor, cursor)
+
+@app.get("/grades/summary", response_model=schemas.GradeSummary)
+async def read_grade_summary(request: Request, response: Response, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "grades")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    return await async_crud.get_grade_summary(db, user_id=current_user.id)
+
+@app.post("/grades/what-if", response_model=schemas.GradeProjection)
+async def project_grades(grades: List[schemas.GradeWhatIf], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.project_grades(db, user_id=current_user.id, hypothetical=grades)
 
 # Events
 @app.post("/events/", response_model=schemas.Event)
-def create_event(event: schemas.EventCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_event(db=db, event=event, user_id=current_user.id)
-
-@app.get("/events/", response_model=List[schemas.Event])
-def read_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_events(db, user_id=current_user.id, skip=skip, limit=limit)
+async def create_event(event: schemas.EventCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    if recurrence.to_utc(event.end_time) < recurrence.to_utc(event.start_time):
+        raise HTTPException(status_code=400, detail="end_time must not be before start_time")
+    return await async_crud.create_event(db=db, event=event, user_id=current_user.id)
+
+@app.get("/events/", response_model=Union[List[schemas.Event], schemas.EventPage])
+async def read_events(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "events")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_events(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, columns=fast_columns(models.Event, schemas.Event))
+    return list_response(response, items, next_cursor, cursor)
+
+# Calendar
+@app.get("/calendar", response_model=List[schemas.CalendarItem], response_model_exclude_none=True)
+async def read_calendar(start: datetime = Query(..., alias="from"), end: datetime = Query(..., alias="to"), db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    # Either bound may carry an offset; compare them as naive UTC like everything else.
+    start, end = recurrence.to_utc(start), recurrence.to_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Calendar range is limited to {CALENDAR_MAX_DAYS} days")
+    return await async_crud.get_calendar(db, user_id=current_user.id, start=start, end=end)
 
 # Study Sessions
 @app.post("/study-sessions/", response_model=schemas.StudySession)
-def create_study_session(study_session: schemas.StudySessionCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.create_study_session(db=db, study_session=study_session, user_id=current_user.id)
-
-@app.get("/study-sessions/", response_model=List[schemas.StudySession])
-def read_study_sessions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_study_sessions(db, user_id=current_user.id, skip=skip, limit=limit)
+async def create_study_session(study_session: schemas.StudySessionCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.create_study_session(db=db, study_session=study_session, user_id=current_user.id)
+
+@app.get("/study-sessions/", response_model=Union[List[schemas.StudySession], schemas.StudySessionPage])
+async def read_study_sessions(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    etag = await list_etag(request, db, current_user.id, "study_sessions")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    items, next_cursor = await async_crud.get_study_sessions(db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor, columns=fast_columns(models.StudySession, schemas.StudySession))
+    return list_response(response, items, next_cursor, cursor)
+
+@app.get("/study-sessions/rollup", response_model=schemas.StudyRollup, response_model_exclude_none=True)
+async def read_study_rollup(request: Request, response: Response, bucket: str = "day", start: Optional[date] = Query(None, alias="from"), end: Optional[date] = Query(None, alias="to"), group_by: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    if bucket not in crud.ROLLUP_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(crud.ROLLUP_BUCKETS)}")
+    if group_by not in (None, "subject"):
+        raise HTTPException(status_code=400, detail="group_by must be 'subject'")
+    etag = await list_etag(request, db, current_user.id, "study_sessions")
+    if (cached := not_modified(request, response, etag)) is not None:
+        return cached
+    return await async_crud.get_study_rollup(db, user_id=current_user.id, bucket=bucket, start=start, end=end, group_by=group_by)
+
+@app.post("/study-sessions/bulk", response_model=List[schemas.StudySession])
+async def create_study_sessions_bulk(study_sessions: List[schemas.StudySessionCreate], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.bulk_create_study_sessions(db, study_sessions, user_id=current_user.id)
+
+@app.patch("/study-sessions/bulk", response_model=schemas.BulkResult)
+async def update_study_sessions_bulk(patches: List[schemas.StudySessionPatch], db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_update_study_sessions(db, patches, user_id=current_user.id)}
+
+@app.delete("/study-sessions/bulk", response_model=schemas.BulkResult)
+async def delete_study_sessions_bulk(request: schemas.BulkDelete, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return {"results": await async_crud.bulk_delete_study_sessions(db, request.ids, user_id=current_user.id)}
 
 @app.put("/study-sessions/{session_id}", response_model=schemas.StudySession)
-def update_study_session(session_id: int, study_session: schemas.StudySessionCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_session = crud.update_study_session(db, session_id=session_id, study_session=study_session, user_id=current_user.id)
+async def update_study_session(session_id: int, study_session: schemas.StudySessionCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_session = await async_crud.update_study_session(db, session_id=session_id, study_session=study_session, user_id=current_user.id)
     if db_session is None:
         raise HTTPException(status_code=404, detail="Study session not found")
     return db_session
 
 @app.delete("/study-sessions/{session_id}", response_model=schemas.StudySession)
-def delete_study_session(session_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    db_session = crud.delete_study_session(db, session_id=session_id, user_id=current_user.id)
+async def delete_study_session(session_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    db_session = await async_crud.delete_study_session(db, session_id=session_id, user_id=current_user.id)
     if db_session is None:
         raise HTTPException(status_code=404, detail="Study session not found")
     return db_session
 
+# Tags
+@app.get("/tags/", response_model=List[schemas.TagCount])
+async def read_tags(kind: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    if kind is not None and kind not in tagging.ITEM_TYPES:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(tagging.ITEM_TYPES)}")
+    return await async_crud.get_tag_counts(db, user_id=current_user.id, item_type=kind)
+
+# Sync
+@app.get("/sync", response_model=schemas.SyncResponse, response_model_exclude_unset=True)
+async def sync(since: Optional[str] = None, collections: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    selected = parse_names(collections, crud.SYNC_COLLECTIONS, "collections") if collections else None
+    return await async_crud.get_changes(db, user_id=current_user.id, since=since, collections=selected)
+
+# Search
+@app.get("/search", response_model=List[schemas.SearchResult])
+async def search_documents(q: str, kind: Optional[str] = None, limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    if kind is not None and kind not in search.KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(search.KINDS)}")
+    return await async_crud.search_documents(db, user_id=current_user.id, q=q, kind=kind, limit=limit)
+
+# Change events
+async def get_stream_user(token: Optional[str] = Depends(optional_oauth2_scheme), access_token: Optional[str] = None,
+                          db: Session = Depends(get_db, scope="function")):
+    # EventSource cannot send headers, so the token may also come as ?access_token=.
+    # The session is released before streaming starts instead of being held open.
+    return await get_current_user(token or access_token or "", db)
+
+@app.get("/events/stream")
+async def stream_events(request: Request, current_user: schemas.User = Depends(get_stream_user)):
+    subscription = changefeed.bus.subscribe(current_user.id)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: change\ndata: {responses.dumps(event).decode()}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/internal/change-feed", dependencies=[Depends(require_operator)])
+def read_change_feed_stats():
+    return changefeed.bus.stats()
+
+# Export and import
+@app.get("/export")
+async def export_data(current_user: schemas.User = Depends(get_current_user)):
+    # The stream outlives the request's own session, so it reads on a dedicated
+    # sync session (iterated in the threadpool by StreamingResponse).
+    def lines():
+        with database.SessionLocal() as db:
+            header = {"type": "header", "version": crud.EXPORT_FORMAT_VERSION, "exported_at": datetime.utcnow()}
+            yield responses.dumps(header) + b"\n"
+            for kind, rows in crud.export_batches(db, current_user.id):
+                yield b"".join(responses.dumps({"type": kind, "data": row}) + b"\n" for row in rows)
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={
+        "Content-Disposition": 'attachment; filename="smartbrain-export.ndjson"',
+    })
+
+@app.post("/import", response_model=schemas.ImportReport)
+async def import_data(request: Request, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    importer = crud.Importer(current_user.id)
+    buffer = b""
+    try:
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                importer.add_line(line)
+            if importer.ready():
+                await async_crud.run(db, importer.flush)
+        importer.add_line(buffer)
+        await async_crud.run(db, importer.flush)
+        await async_crud.commit(db)
+    except SQLAlchemyError:
+        await async_crud.rollback(db)
+        raise HTTPException(status_code=400, detail=f"Import failed near line {importer.lines}; nothing was imported")
+    return importer.report()
+
+# Bootstrap
+@app.get("/bootstrap", response_model=schemas.Bootstrap, response_model_exclude_unset=True)
+async def bootstrap(fields: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    # Everything the first page paint needs in one round trip; ?fields= picks sections.
+    selected = parse_names(fields, ["user", *crud.BOOTSTRAP_LOADERS], "fields") if fields else ["user", *crud.BOOTSTRAP_LOADERS]
+    sections = [name for name in selected if name != "user"]
+    if BOOTSTRAP_CONCURRENT and len(sections) > 1:
+        results = await asyncio.gather(*(
+            async_crud.run_in_new_session(crud.BOOTSTRAP_LOADERS[name], current_user.id) for name in sections
+        ))
+        payload = dict(zip(sections, results))
+    elif sections:
+        payload = await async_crud.get_bootstrap(db, user_id=current_user.id, sections=sections)
+    else:
+        payload = {}
+    if "user" in selected:
+        # Dump with defaults so exclude_unset keeps is_active, which the cached principal never sets.
+        payload["user"] = current_user.dict()
+    return payload
+
 # Stats
 @app.get("/stats/")
-def read_stats(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return crud.get_stats(db, user_id=current_user.id)
+async def read_stats(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    return await async_crud.get_stats(db, user_id=current_user.id)
 
 
@@ -0,0 +1,131 @@
+import math
+import threading
+import database
+
+# Request metrics exported on /metrics in the Prometheus text format.
+#
+# middleware.MetricsMiddleware observes every HTTP request into the
+# histograms below, labelled by route template (never the raw path, which
+# would explode the series count). Query totals, slow statements and pool
+# figures are read from database.py at scrape time.
+
+PREFIX = "smartbrain"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+requests_total = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+request_queries = Histogram("db_queries_per_request", "SQL statements executed per HTTP request.", ("method", "route"), QUERY_COUNT_BUCKETS)
+request_db_time = Histogram("db_time_per_request_seconds", "Time spent in SQL statements per HTTP request.", ("method", "route"))
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats: database.RequestQueryStats):
+    labels = (method, route)
+    requests_total.inc((method, route, str(status)))
+    request_duration.observe(labels, seconds)
+    request_queries.observe(labels, stats.queries)
+    request_db_time.observe(labels, stats.seconds)
+
+def _samples(name: str, documentation: str, samples, kind="gauge"):
+    # samples: [(labels dict, value)]
+    name = f"{PREFIX}_{name}"
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+def _database_lines():
+    queries = database.query_metrics.snapshot()
+    lines = []
+    lines += _samples("db_queries_total", "SQL statements executed.", [({}, queries["queries"])], "counter")
+    lines += _samples("db_query_seconds_total", "Time spent in SQL statements.", [({}, queries["seconds_total"])], "counter")
+    lines += _samples("db_slow_queries_total", f"SQL statements slower than {database.SLOW_QUERY_MS:g} ms.", [({}, queries["slow_queries"])], "counter")
+    slow = queries["slow_statements"].items()
+    lines += _samples("db_slow_statement_total", "Slow executions per statement (most recent statements only).",
+                      [({"statement": statement}, count) for statement, (count, _, _) in slow], "counter")
+    lines += _samples("db_slow_statement_max_seconds", "Slowest execution per statement.",
+                      [({"statement": statement}, longest) for statement, (_, _, longest) in slow])
+
+    pools = database.get_pool_status()
+    for field, name, kind, documentation in (
+        ("checked_out", "checked_out", "gauge", "Connections currently checked out."),
+        ("overflow", "overflow", "gauge", "Connections open beyond pool_size."),
+        ("checkouts", "checkouts_total", "counter", "Connection checkouts."),
+        ("timeouts", "timeouts_total", "counter", "Checkouts that timed out waiting for a connection."),
+        ("wait_seconds_total", "wait_seconds_total", "counter", "Time spent waiting for a connection."),
+    ):
+        samples = [({"engine": engine}, status[field]) for engine, status in pools.items() if field in status]
+        lines += _samples(f"db_pool_{name}", documentation, samples, kind)
+    return lines
+
+def render() -> str:
+    lines = []
+    for metric in (requests_total, request_duration, request_queries, request_db_time):
+        lines += metric.render()
+    lines += _database_lines()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,330 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from logging_config import request_id_var
+import database, metrics
+
+try:
+    import brotli
+except ImportError:  # optional; br is then not offered
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional; zstd is then not offered
+    zstandard = None
+
+logger = logging.getLogger("smartbrain.access")
+
+REQUEST_ID_HEADER = b"x-request-id"
+SERVER_TIMING_HEADER = b"server-timing"
+
+# Add a Server-Timing header (total and DB time, query count) to every response.
+SERVER_TIMING = database.env_flag("SERVER_TIMING", "false")
+
+# Response compression
+COMPRESSION = database.env_flag("COMPRESSION", "true")
+# Smaller bodies are sent as-is: the framing overhead outweighs the savings.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+# Server preference, best first; encodings whose library is missing are skipped.
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+# Memory budget for compressed bodies of responses that carry an ETag.
+COMPRESSED_CACHE_MAX_BYTES = int(os.getenv("COMPRESSED_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+class RequestContextMiddleware:
+    """Assigns each HTTP request a correlation id and writes an access log line.
+
+    An incoming X-Request-ID header is reused (so ids can be traced across
+    services); otherwise a new one is generated. The id is echoed back on
+    the response and attached to every log record emitted while handling it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.info(
+                "%s %s %s",
+                scope["method"], scope["path"], status_code,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                },
+            )
+            request_id_var.reset(token)
+
+def route_of(scope):
+    # The matched route's template, so /tasks/1 and /tasks/2 share one series.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Records latency, SQL statement count and DB time per request into metrics.py.
+
+    Statements are attributed through database.request_query_stats, which
+    the engine hooks in database.py update. With SERVER_TIMING enabled the
+    figures are also reported to the client in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = database.RequestQueryStats()
+        token = database.request_query_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    total_ms = (time.perf_counter() - start) * 1000
+                    value = f'db;dur={stats.seconds * 1000:.2f};desc="{stats.queries} queries", app;dur={total_ms:.2f}'
+                    message["headers"] = list(message.get("headers", [])) + [(SERVER_TIMING_HEADER, value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            # The route template is only known once the app has matched it, so
+            # slow queries logged before then carry the raw path.
+            stats.route = scope["path"]
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            stats.route = route_of(scope)
+            metrics.observe_request(scope["method"], stats.route, status_code, time.perf_counter() - start, stats)
+            database.request_query_stats.reset(token)
+
+# Compression
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+SUPPORTED_ENCODINGS = [name.strip() for name in COMPRESSION_ENCODINGS.split(",") if name.strip() in ENCODERS]
+
+def encode(encoding: str, body: bytes) -> bytes:
+    encoder = ENCODERS[encoding]()
+    return encoder.compress(body) + encoder.finish()
+
+def negotiate(accept_encoding: str):
+    """The preferred supported encoding the client accepts (q > 0), or None."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip()] = quality
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+class CompressedBodyCache:
+    """LRU of compressed response bodies keyed by ``(path, ETag, encoding)``, bounded in bytes.
+
+    The list ETags embed the user id and collection version, so an entry is
+    private to one user and stops being served as soon as a write changes
+    the ETag; stale entries simply age out.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+compressed_cache = CompressedBodyCache(COMPRESSED_CACHE_MAX_BYTES)
+
+def cached_body(headers: Headers, method: str, path: str, etag: str):
+    """``(encoding, body)`` of the cached compressed response for ``etag``, if any.
+
+    Checked by the list routes right after their ETag, so a repeat load
+    skips the query and serialization as well as the compression.
+    """
+    if not COMPRESSION or method == "HEAD":
+        return None
+    encoding = negotiate(headers.get("accept-encoding", ""))
+    if encoding is None:
+        return None
+    body = compressed_cache.get((path, etag, encoding))
+    return (encoding, body) if body is not None else None
+
+class CompressionMiddleware:
+    """Compresses JSON/text responses and sets caching headers for authenticated ones.
+
+    Complete bodies of at least COMPRESSION_MIN_SIZE bytes are compressed in
+    one go; those of 200 responses with an ETag are kept in compressed_cache
+    for cached_body. Already-encoded responses pass through. Streamed bodies (e.g. /export) are compressed
+    chunk by chunk. Authenticated responses get ``Vary: Authorization`` and
+    default to ``Cache-Control: private, no-cache``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION:
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", "")) if scope["method"] != "HEAD" else None
+        authenticated = "authorization" in request_headers
+        start_message = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            if start_message is None:
+                # Streaming: the response has already been started below.
+                if encoder is not None:
+                    chunk = encoder.compress(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        chunk += encoder.finish()
+                    message = dict(message, body=chunk)
+                return await send(message)
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=list(start["headers"]))
+            start["headers"] = headers.raw
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            compressible = (
+                start["status"] not in (204, 206, 304)
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                and not headers.get("content-type", "").startswith("text/event-stream")
+            )
+            if compressible or start["status"] == 304:
+                headers.add_vary_header("Accept-Encoding")
+                if authenticated:
+                    headers.add_vary_header("Authorization")
+                    headers.setdefault("Cache-Control", "private, no-cache")
+            if start["status"] == 304 and encoding is not None and headers.get("etag", "W/").startswith('"'):
+                # Revalidating a compressed representation: keep the tag the client holds.
+                headers["ETag"] = f"W/{headers['etag']}"
+            if not compressible or encoding is None or (not more_body and len(body) < COMPRESSION_MIN_SIZE):
+                await send(start)
+                return await send(message)
+
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag:
+                # The encoded representation differs byte for byte; clients send
+                # it back as W/"...", which main.not_modified accepts.
+                headers["ETag"] = etag if etag.startswith("W/") else f"W/{etag}"
+            if more_body:
+                del headers["Content-Length"]
+                encoder = ENCODERS[encoding]()
+                await send(start)
+                return await send(dict(message, body=encoder.compress(body)))
+
+            compressed = encode(encoding, body)
+            if etag and start["status"] == 200:
+                compressed_cache.set((scope["path"], etag, encoding), compressed)
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send(dict(message, body=compressed))
+
+        await self.app(scope, receive, send_compressed)
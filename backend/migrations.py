@@ -0,0 +1,163 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, func, insert, inspect, select, text, update
+from database import Base, engine
+import models, recurrence, search, tagging
+
+# Bookkeeping table recording which migrations have been applied.
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_lock so concurrent workers don't race on startup.
+ADVISORY_LOCK_ID = 7262011
+
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+# Helpers
+def has_column(conn, table: str, column: str):
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_column(conn, table: str, column: str, ddl_type: str):
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+def create_indexes(conn, model):
+    columns = {c["name"] for c in inspect(conn).get_columns(model.__tablename__)}
+    for index in model.__table__.indexes:
+        # Indexes on columns added by a later migration are created by that migration.
+        if all(column.name in columns for column in index.columns):
+            index.create(conn, checkfirst=True)
+
+# Migrations
+@migration(1, "initial schema")
+def initial_schema(conn):
+    # Fresh databases get the current models; existing ones are left untouched.
+    Base.metadata.create_all(bind=conn)
+
+@migration(2, "per-user composite indexes")
+def per_user_indexes(conn):
+    for model in (models.Project, models.Task, models.Note, models.Resource,
+                  models.Grade, models.Event, models.StudySession):
+        create_indexes(conn, model)
+
+@migration(3, "full-text search index")
+def full_text_search(conn):
+    search.create_index(conn)
+
+@migration(4, "normalized tag index")
+def normalized_tags(conn):
+    Base.metadata.create_all(bind=conn, tables=[models.Tag.__table__, models.ItemTag.__table__])
+    tagging.backfill(conn)
+
+@migration(5, "collection versions")
+def collection_versions(conn):
+    Base.metadata.create_all(bind=conn, tables=[models.CollectionVersion.__table__])
+
+@migration(6, "row versions and tombstones for delta sync")
+def row_versions(conn):
+    for model in (models.Project, models.Task, models.Note, models.Resource,
+                  models.Grade, models.Event, models.StudySession):
+        add_column(conn, model.__tablename__, "row_version", "INTEGER NOT NULL DEFAULT 0")
+        create_indexes(conn, model)
+    Base.metadata.create_all(bind=conn, tables=[models.Tombstone.__table__])
+
+@migration(7, "event timestamps and recurrence rules")
+def event_timestamps(conn):
+    add_column(conn, "events", "series_end", "TIMESTAMP")
+    events = models.Event.__table__
+    params = []
+    for event_id, start, end, rule in conn.execute(text("SELECT id, start_time, end_time, recurrence FROM events")):
+        start, end = recurrence.parse_timestamp(start), recurrence.parse_timestamp(end)
+        try:
+            rule = recurrence.normalize_rule(rule)
+            last = recurrence.series_end(start, end, rule)
+        except recurrence.InvalidRecurrence:
+            rule, last = None, end
+        params.append({"event_id": event_id, "start": start, "end": end, "rule": rule, "series_end": last})
+    if params:
+        # Written through the model's DateTime columns so SQLite gets its canonical format.
+        conn.execute(
+            update(events).where(events.c.id == bindparam("event_id")).values(
+                start_time=bindparam("start"), end_time=bindparam("end"),
+                recurrence=bindparam("rule"), series_end=bindparam("series_end"),
+            ),
+            params,
+        )
+    if conn.dialect.name == "postgresql":
+        for column in ("start_time", "end_time"):
+            conn.execute(text(f"ALTER TABLE events ALTER COLUMN {column} TYPE TIMESTAMP USING {column}::timestamp"))
+    create_indexes(conn, models.Event)
+    create_indexes(conn, models.Task)
+
+@migration(8, "daily study rollup")
+def study_daily(conn):
+    Base.metadata.create_all(bind=conn, tables=[models.StudyDaily.__table__])
+    sessions = models.StudySession.__table__
+    subject = func.coalesce(sessions.c.subject, "")
+    conn.execute(insert(models.StudyDaily.__table__).from_select(
+        ["user_id", "day", "subject", "minutes", "sessions"],
+        select(sessions.c.user_id, sessions.c.date, subject,
+               func.coalesce(func.sum(sessions.c.duration_minutes), 0), func.count())
+        .where(sessions.c.date.isnot(None), sessions.c.user_id.isnot(None))
+        .group_by(sessions.c.user_id, sessions.c.date, subject),
+    ))
+
+@migration(9, "revoked tokens")
+def revoked_tokens(conn):
+    Base.metadata.create_all(bind=conn, tables=[models.RevokedToken.__table__])
+
+@migration(10, "revoked token sync index")
+def revoked_tokens_sync_index(conn):
+    create_indexes(conn, models.RevokedToken)
+
+@migration(11, "tombstone retention")
+def tombstone_retention(conn):
+    add_column(conn, "tombstones", "deleted_at", "TIMESTAMP")
+    # Existing tombstones get a full retention window from now.
+    conn.execute(update(models.Tombstone.__table__).where(models.Tombstone.deleted_at.is_(None))
+                 .values(deleted_at=datetime.utcnow()))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE tombstones ALTER COLUMN deleted_at SET NOT NULL"))
+    add_column(conn, "collection_versions", "pruned_version", "INTEGER NOT NULL DEFAULT 0")
+
+# Runner
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version))}
+
+def upgrade(bind=engine):
+    migration_metadata.create_all(bind=bind)
+    with bind.connect() as lock_conn:
+        postgres = bind.dialect.name == "postgresql"
+        if postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            with bind.connect() as conn:
+                done = applied_versions(conn)
+            for version, name, fn in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"Applying migration {version}: {name}")
+                with bind.begin() as conn:
+                    fn(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+        finally:
+            if postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+                lock_conn.commit()
+
+if __name__ == "__main__":
+    upgrade()
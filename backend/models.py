@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -19,18 +19,29 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_user_id_id", "user_id", "id"),
+        Index("ix_projects_user_id_row_version", "user_id", "row_version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String, nullable=True)
     deadline = Column(Date, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
     
     tasks = relationship("Task", back_populates="project")
     owner = relationship("User", back_populates="projects")
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_user_id_row_version", "user_id", "row_version"),
+        Index("ix_tasks_user_id_is_completed", "user_id", "is_completed"),
+        Index("ix_tasks_user_id_due_date", "user_id", "due_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -42,12 +53,17 @@ class Task(Base):
     tags = Column(String, nullable=True) # Comma separated tags
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     project = relationship("Project", back_populates="tasks")
     owner = relationship("User", back_populates="tasks")
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        Index("ix_notes_user_id_id", "user_id", "id"),
+        Index("ix_notes_user_id_row_version", "user_id", "row_version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -56,11 +72,16 @@ class Note(Base):
     created_at = Column(Date, nullable=True)
     updated_at = Column(Date, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     owner = relationship("User", back_populates="notes")
 
 class Resource(Base):
     __tablename__ = "resources"
+    __table_args__ = (
+        Index("ix_resources_user_id_id", "user_id", "id"),
+        Index("ix_resources_user_id_row_version", "user_id", "row_version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -68,11 +89,17 @@ class Resource(Base):
     type = Column(String, nullable=True) # Link, PDF, Video, etc.
     tags = Column(String, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     owner = relationship("User", back_populates="resources")
 
 class Grade(Base):
     __tablename__ = "grades"
+    __table_args__ = (
+        Index("ix_grades_user_id_id", "user_id", "id"),
+        Index("ix_grades_user_id_row_version", "user_id", "row_version"),
+        Index("ix_grades_user_id_date", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(String, index=True)
@@ -80,29 +107,113 @@ class Grade(Base):
     weight = Column(Float, default=1.0)
     date = Column(Date, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     owner = relationship("User", back_populates="grades")
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_user_id_id", "user_id", "id"),
+        Index("ix_events_user_id_row_version", "user_id", "row_version"),
+        Index("ix_events_user_id_start_time", "user_id", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String, nullable=True)
-    start_time = Column(String) # Storing as ISO string for simplicity
-    end_time = Column(String)
-    recurrence = Column(String, nullable=True) # e.g., "weekly"
+    start_time = Column(DateTime) # naive UTC
+    end_time = Column(DateTime)
+    recurrence = Column(String, nullable=True) # RRULE, e.g. "FREQ=WEEKLY;BYDAY=MO,WE"
+    series_end = Column(DateTime, nullable=True) # end of the last occurrence, NULL if the rule never ends
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     owner = relationship("User", back_populates="events")
 
 class StudySession(Base):
     __tablename__ = "study_sessions"
+    __table_args__ = (
+        Index("ix_study_sessions_user_id_id", "user_id", "id"),
+        Index("ix_study_sessions_user_id_row_version", "user_id", "row_version"),
+        Index("ix_study_sessions_user_id_date", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(String, index=True)
     duration_minutes = Column(Integer)
     date = Column(Date, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    row_version = Column(Integer, default=0, nullable=False) # collection version of the last write
 
     owner = relationship("User", back_populates="study_sessions")
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    pending_tasks = Column(Integer, default=0, nullable=False)
+    notes_count = Column(Integer, default=0, nullable=False)
+    study_minutes = Column(Integer, default=0, nullable=False)
+    study_sessions_count = Column(Integer, default=0, nullable=False)
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (
+        Index("ix_tags_user_id_name", "user_id", "name", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+class ItemTag(Base):
+    __tablename__ = "item_tags"
+    __table_args__ = (
+        Index("ix_item_tags_item_type_item_id", "item_type", "item_id"),
+    )
+
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    item_type = Column(String, primary_key=True) # task, note, resource
+    item_id = Column(Integer, primary_key=True)
+
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    collection = Column(String, primary_key=True) # tasks, notes, ...
+    version = Column(Integer, nullable=False, default=0)
+    pruned_version = Column(Integer, nullable=False, default=0) # tombstones up to this version are gone
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+    __table_args__ = (
+        Index("ix_tombstones_user_id_collection_row_version", "user_id", "collection", "row_version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    collection = Column(String, nullable=False)
+    ref_id = Column(Integer, nullable=False)
+    row_version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
+
+class StudyDaily(Base):
+    # Per-day, per-subject study totals maintained by crud on every session write.
+    __tablename__ = "study_daily"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    subject = Column(String, primary_key=True)
+    minutes = Column(Integer, default=0, nullable=False)
+    sessions = Column(Integer, default=0, nullable=False)
+
+class RevokedToken(Base):
+    # Token ids (jti) revoked before their expiry; rows are pruned once expired.
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
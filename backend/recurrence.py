@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+import itertools
+from dateutil.rrule import rrulestr
+
+# Recurrence rules for events.
+#
+# Events store an RFC 5545 RRULE without DTSTART (the event's start_time
+# is the series start), e.g. "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=10". The old
+# free-text values ("weekly", ...) are mapped onto the equivalent rule.
+# Timestamps are naive UTC throughout.
+
+LEGACY_RULES = {
+    "daily": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY",
+    "biweekly": "FREQ=WEEKLY;INTERVAL=2",
+    "monthly": "FREQ=MONTHLY",
+    "yearly": "FREQ=YEARLY",
+    "annually": "FREQ=YEARLY",
+}
+
+# Bounded series are walked once on write to find their last occurrence, so
+# both COUNT and the occurrences before UNTIL are capped at this.
+MAX_COUNT = 10000
+
+class InvalidRecurrence(ValueError):
+    pass
+
+def to_utc(value: datetime):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def parse_timestamp(value):
+    # Accepts datetimes and the ISO strings events used to be stored as.
+    if value is None or isinstance(value, datetime):
+        return to_utc(value)
+    try:
+        return to_utc(datetime.fromisoformat(str(value).strip()))
+    except ValueError:
+        return None
+
+def rule_parts(rule: str):
+    return dict(part.split("=", 1) for part in rule.split(";") if "=" in part)
+
+def build(rule: str, start: datetime):
+    return rrulestr(rule, dtstart=start, ignoretz=True)
+
+def normalize_rule(value):
+    if value is None or not value.strip():
+        return None
+    rule = LEGACY_RULES.get(value.strip().lower(), value.strip()).upper()
+    if rule.startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    try:
+        build(rule, datetime(2000, 1, 1))
+        count = int(rule_parts(rule).get("COUNT", 0))
+    except (ValueError, TypeError):
+        raise InvalidRecurrence(f"Invalid recurrence rule: {value}")
+    if count > MAX_COUNT:
+        raise InvalidRecurrence(f"Recurrence COUNT must be at most {MAX_COUNT}")
+    return rule
+
+def series_end(start: datetime, end: datetime, rule):
+    """End of the last occurrence, or None if the rule repeats forever."""
+    if rule is None or start is None or end is None:
+        return end
+    parts = rule_parts(rule)
+    if "COUNT" not in parts and "UNTIL" not in parts:
+        return None
+    last = start
+    for index, last in enumerate(itertools.islice(build(rule, start), MAX_COUNT + 1)):
+        if index == MAX_COUNT:
+            raise InvalidRecurrence(f"Recurrence must end within {MAX_COUNT} occurrences")
+    return last + (end - start)
+
+def occurrences(start: datetime, end: datetime, rule, window_start: datetime, window_end: datetime):
+    """Yield ``(start, end)`` of each occurrence overlapping the window, in order.
+
+    Occurrences are generated lazily from the first one that can reach the
+    window and generation stops at the window's end, so an open-ended
+    series costs only what falls inside the range.
+    """
+    duration = end - start
+    if rule is None:
+        if start < window_end and (end > window_start or start >= window_start):
+            yield start, end
+        return
+    # An occurrence overlaps the window if it ends after window_start; zero-length
+    # occurrences count when they sit exactly on it.
+    for occurrence in build(rule, start).xafter(window_start - duration, inc=not duration):
+        if occurrence >= window_end:
+            return
+        yield occurrence, occurrence + duration
+
+def day_bounds(day):
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from typing import Any
+import json
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+# Fast serialization for list endpoints.
+#
+# The regular path validates every ORM object into its Pydantic schema and
+# then JSON-encodes the result. For rows that came straight out of a typed
+# column select there is nothing left to validate, so the fast path turns
+# them into dicts and encodes them in a single orjson call.
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def schema_columns(model, schema):
+    # The model columns backing each field of a response schema, in schema order.
+    return [getattr(model, name) for name in schema.model_fields]
+
+def rows_to_dicts(rows):
+    return [row._asdict() for row in rows]
@@ -1,6 +1,20 @@
-from pydantic import BaseModel
-from typing import List, Optional, Union
-from datetime import date
+from pydantic import BaseModel, field_validator
+from typing import ClassVar, Dict, List, Optional, Union
+from datetime import date, datetime
+
+# Fields named `date` shadow the type inside their class body; annotate those with this alias.
+DateType = date
+
+class PatchBase(BaseModel):
+    # Fields a patch may leave out but not clear: their columns back required response fields.
+    not_null: ClassVar[tuple] = ()
+
+    @field_validator("*")
+    @classmethod
+    def reject_null(cls, value, info):
+        if value is None and info.field_name in cls.not_null:
+            raise ValueError("may be omitted but not null")
+        return value
 
 class TaskBase(BaseModel):
     title: str
@@ -20,6 +34,22 @@ class Task(TaskBase):
     class Config:
         orm_mode = True
 
+class TaskPage(BaseModel):
+    items: List[Task]
+    next_cursor: Optional[str] = None
+
+class TaskPatch(PatchBase):
+    not_null = ("title", "is_completed", "priority", "status")
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[date] = None
+    is_completed: Optional[bool] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    tags: Optional[str] = None
+    project_id: Optional[int] = None
+
 class NoteBase(BaseModel):
     title: str
     content: Optional[str] = None
@@ -35,6 +65,19 @@ class Note(NoteBase):
     class Config:
         orm_mode = True
 
+class NotePage(BaseModel):
+    items: List[Note]
+    next_cursor: Optional[str] = None
+
+class NotePatch(PatchBase):
+    not_null = ("title",)
+    id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+    tags: Optional[str] = None
+    created_at: Optional[date] = None
+    updated_at: Optional[date] = None
+
 class ResourceBase(BaseModel):
     title: str
     url: Optional[str] = None
@@ -49,6 +92,10 @@ class Resource(ResourceBase):
     class Config:
         orm_mode = True
 
+class ResourcePage(BaseModel):
+    items: List[Resource]
+    next_cursor: Optional[str] = None
+
 class ProjectBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -57,17 +104,29 @@ class ProjectBase(BaseModel):
 class ProjectCreate(ProjectBase):
     pass
 
+class ProjectProgress(BaseModel):
+    total: int = 0
+    done: int = 0
+    overdue: int = 0
+    percent_complete: float = 0.0
+
 class Project(ProjectBase):
     id: int
+    # Only filled with ?include=tasks on the list endpoint; empty otherwise.
     tasks: List[Task] = []
+    progress: ProjectProgress = ProjectProgress()
     class Config:
         orm_mode = True
 
+class ProjectPage(BaseModel):
+    items: List[Project]
+    next_cursor: Optional[str] = None
+
 class GradeBase(BaseModel):
     subject: str
     score: float
     weight: float = 1.0
-    date: Optional[date] = None
+    date: Optional[DateType] = None
 
 class GradeCreate(GradeBase):
     pass
@@ -77,25 +136,72 @@ class Grade(GradeBase):
     class Config:
         orm_mode = True
 
+class GradePage(BaseModel):
+    items: List[Grade]
+    next_cursor: Optional[str] = None
+
+class SubjectSummary(BaseModel):
+    subject: str
+    average: Optional[float] = None
+    grade_points: Optional[float] = None
+    count: int
+    total_weight: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class TermTrend(BaseModel):
+    term: str
+    average: Optional[float] = None
+    cumulative_average: Optional[float] = None
+    change: Optional[float] = None
+    count: int
+
+class GradeSummary(BaseModel):
+    count: int
+    overall_average: Optional[float] = None
+    gpa: Optional[float] = None
+    subjects: List[SubjectSummary] = []
+    terms: List[TermTrend] = []
+    percentiles: Dict[str, float] = {}
+    bands: Dict[str, int] = {}
+
+class GradeWhatIf(BaseModel):
+    subject: str
+    score: float
+    weight: float = 1.0
+
+class GradeProjection(BaseModel):
+    count: int
+    overall_average: Optional[float] = None
+    gpa: Optional[float] = None
+    subjects: List[SubjectSummary] = []
+
 class EventBase(BaseModel):
     title: str
     description: Optional[str] = None
-    start_time: str
-    end_time: str
-    recurrence: Optional[str] = None
+    start_time: datetime
+    end_time: datetime
+    recurrence: Optional[str] = None # RRULE, e.g. "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=10"
 
 class EventCreate(EventBase):
     pass
 
 class Event(EventBase):
     id: int
+    # Legacy rows whose ISO strings could not be parsed were migrated to NULL.
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
     class Config:
         orm_mode = True
 
+class EventPage(BaseModel):
+    items: List[Event]
+    next_cursor: Optional[str] = None
+
 class StudySessionBase(BaseModel):
     subject: str
     duration_minutes: int
-    date: Union[date, None] = None
+    date: Optional[DateType] = None
 
 class StudySessionCreate(StudySessionBase):
     pass
@@ -105,6 +211,116 @@ class StudySession(StudySessionBase):
     class Config:
         orm_mode = True
 
+class StudySessionPage(BaseModel):
+    items: List[StudySession]
+    next_cursor: Optional[str] = None
+
+class StudyRollupItem(BaseModel):
+    bucket: date
+    subject: Optional[str] = None
+    minutes: int
+    sessions: int
+
+class StudyRollup(BaseModel):
+    bucket: str
+    items: List[StudyRollupItem]
+    total_minutes: int
+    total_sessions: int
+
+class StudySessionPatch(PatchBase):
+    not_null = ("subject", "duration_minutes")
+    id: int
+    subject: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    date: Optional[DateType] = None
+
+class BulkDelete(BaseModel):
+    ids: List[int]
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: str
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
+class SearchResult(BaseModel):
+    kind: str
+    ref_id: int
+    title: Optional[str] = None
+    title_highlight: Optional[str] = None
+    snippet: Optional[str] = None
+    rank: float
+
+class ProjectRow(ProjectBase):
+    # Project without its tasks; /sync sends tasks as their own collection.
+    id: int
+    class Config:
+        orm_mode = True
+
+class CollectionChanges(BaseModel):
+    deleted: List[int] = []
+    # Set when the token predates the pruned tombstones: every row is sent
+    # and the client should replace its copy instead of merging.
+    reset: bool = False
+
+class TaskChanges(CollectionChanges):
+    upserted: List[Task] = []
+
+class NoteChanges(CollectionChanges):
+    upserted: List[Note] = []
+
+class ResourceChanges(CollectionChanges):
+    upserted: List[Resource] = []
+
+class ProjectChanges(CollectionChanges):
+    upserted: List[ProjectRow] = []
+
+class GradeChanges(CollectionChanges):
+    upserted: List[Grade] = []
+
+class EventChanges(CollectionChanges):
+    upserted: List[Event] = []
+
+class StudySessionChanges(CollectionChanges):
+    upserted: List[StudySession] = []
+
+class SyncResponse(BaseModel):
+    token: str
+    tasks: Optional[TaskChanges] = None
+    notes: Optional[NoteChanges] = None
+    resources: Optional[ResourceChanges] = None
+    projects: Optional[ProjectChanges] = None
+    grades: Optional[GradeChanges] = None
+    events: Optional[EventChanges] = None
+    study_sessions: Optional[StudySessionChanges] = None
+
+class CalendarItem(BaseModel):
+    kind: str # event, task, study_session
+    id: int
+    title: Optional[str] = None
+    start: datetime
+    end: datetime
+    all_day: bool = False
+    recurring: bool = False
+    is_completed: Optional[bool] = None
+    duration_minutes: Optional[int] = None
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+class ImportReport(BaseModel):
+    lines: int
+    imported: Dict[str, int]
+    error_count: int
+    errors: List[ImportLineError] = []
+    warnings: List[ImportLineError] = []
+
 class UserBase(BaseModel):
     email: str
 
@@ -117,9 +333,25 @@ class User(UserBase):
     class Config:
         orm_mode = True
 
+class Bootstrap(BaseModel):
+    user: Optional[User] = None
+    stats: Optional[dict] = None
+    upcoming_tasks: Optional[List[Task]] = None
+    recent_notes: Optional[List[Note]] = None
+    week_study_sessions: Optional[List[StudySession]] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    # Also revoke this refresh token (the access token is always revoked).
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     email: Optional[str] = None
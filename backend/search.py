@@ -0,0 +1,217 @@
+from sqlalchemy import inspect, or_, text
+from sqlalchemy.orm import Session
+import html
+import os
+import re
+import models
+
+# Full-text search over notes, tasks and resources.
+#
+# Postgres keeps one row per document in search_documents with a weighted
+# tsvector column behind a GIN index; SQLite uses an FTS5 virtual table.
+# Both are keyed by doc_id so crud can upsert/delete a document with a
+# primary-key lookup. Databases without either fall back to LIKE queries.
+
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# The database marks matches with private-use characters; the text is HTML-escaped
+# before they become HIGHLIGHT_START/END, so stored markup never reaches clients.
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+
+KINDS = {"note": 1, "task": 2, "resource": 3}
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:title, '')), 'A') ||
+    setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:tags, '')), 'B') ||
+    setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:body, '')), 'C')
+"""
+
+_backends = {}
+
+def doc_id(kind: str, ref_id: int):
+    return ref_id * 4 + KINDS[kind]
+
+def document_fields(kind: str, obj):
+    if kind == "note":
+        return obj.title, obj.content, obj.tags
+    if kind == "task":
+        return obj.title, obj.description, obj.tags
+    return obj.title, None, obj.tags
+
+def backend(db: Session):
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _backends:
+        tables = inspect(bind).get_table_names()
+        if bind.dialect.name == "postgresql" and "search_documents" in tables:
+            _backends[key] = "postgres"
+        elif bind.dialect.name == "sqlite" and "search_index" in tables:
+            _backends[key] = "fts5"
+        else:
+            _backends[key] = None
+    return _backends[key]
+
+# Index maintenance (called by crud inside the write transaction)
+def index_document(db: Session, kind: str, obj):
+    engine = backend(db)
+    if engine is None:
+        return
+    title, body, tags = document_fields(kind, obj)
+    params = {"doc_id": doc_id(kind, obj.id), "user_id": obj.user_id, "kind": kind,
+              "ref_id": obj.id, "title": title, "body": body, "tags": tags}
+    if engine == "postgres":
+        db.execute(text(f"""
+            INSERT INTO search_documents (doc_id, user_id, kind, ref_id, title, body, tags, document)
+            VALUES (:doc_id, :user_id, :kind, :ref_id, :title, :body, :tags, {POSTGRES_DOCUMENT})
+            ON CONFLICT (doc_id) DO UPDATE SET
+                title = EXCLUDED.title, body = EXCLUDED.body,
+                tags = EXCLUDED.tags, document = EXCLUDED.document
+        """), dict(params, language=SEARCH_LANGUAGE))
+    else:
+        db.execute(text("DELETE FROM search_index WHERE rowid = :doc_id"), params)
+        db.execute(text("""
+            INSERT INTO search_index (rowid, title, body, tags, kind, ref_id, user_id)
+            VALUES (:doc_id, :title, :body, :tags, :kind, :ref_id, :user_id)
+        """), params)
+
+def index_documents(db: Session, kind: str, objs):
+    for obj in objs:
+        index_document(db, kind, obj)
+
+def remove_documents(db: Session, kind: str, ref_ids):
+    engine = backend(db)
+    if engine is None or not ref_ids:
+        return
+    table = "search_documents" if engine == "postgres" else "search_index"
+    column = "doc_id" if engine == "postgres" else "rowid"
+    db.execute(
+        text(f"DELETE FROM {table} WHERE {column} = :doc_id"),
+        [{"doc_id": doc_id(kind, ref_id)} for ref_id in ref_ids],
+    )
+
+# Queries
+def render_highlight(value):
+    if value is None:
+        return None
+    return html.escape(value).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+def render_results(rows):
+    results = []
+    for row in rows:
+        result = dict(row._mapping)
+        result["title_highlight"] = render_highlight(result["title_highlight"])
+        result["snippet"] = render_highlight(result["snippet"])
+        results.append(result)
+    return results
+
+def like_pattern(q: str):
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def fts5_query(q: str):
+    # Quote each term so user input can't hit FTS5 query syntax; prefix-match the last one.
+    terms = [term.replace('"', '""') for term in re.findall(r"\w+", q)]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def search(db: Session, user_id: int, q: str, kind: str = None, limit: int = 20):
+    engine = backend(db)
+    if engine == "postgres":
+        rows = db.execute(text(f"""
+            SELECT kind, ref_id, title,
+                   ts_headline(CAST(:language AS regconfig), coalesce(title, ''), query,
+                               'StartSel={MATCH_START}, StopSel={MATCH_END}, HighlightAll=true') AS title_highlight,
+                   ts_headline(CAST(:language AS regconfig), coalesce(body, tags, ''), query,
+                               'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxFragments=2') AS snippet,
+                   ts_rank_cd(document, query) AS rank
+            FROM search_documents, websearch_to_tsquery(CAST(:language AS regconfig), :q) AS query
+            WHERE user_id = :user_id AND document @@ query
+              AND (CAST(:kind AS VARCHAR) IS NULL OR kind = :kind)
+            ORDER BY rank DESC
+            LIMIT :limit
+        """), {"language": SEARCH_LANGUAGE, "q": q, "user_id": user_id, "kind": kind, "limit": limit})
+        return render_results(rows)
+    if engine == "fts5":
+        match = fts5_query(q)
+        if match is None:
+            return []
+        rows = db.execute(text(f"""
+            SELECT kind, ref_id, title,
+                   highlight(search_index, 0, '{MATCH_START}', '{MATCH_END}') AS title_highlight,
+                   snippet(search_index, -1, '{MATCH_START}', '{MATCH_END}', '…', 16) AS snippet,
+                   -bm25(search_index, 10.0, 1.0, 5.0) AS rank
+            FROM search_index
+            WHERE search_index MATCH :match AND user_id = :user_id
+              AND (:kind IS NULL OR kind = :kind)
+            ORDER BY rank DESC
+            LIMIT :limit
+        """), {"match": match, "user_id": user_id, "kind": kind, "limit": limit})
+        return render_results(rows)
+    return _search_like(db, user_id, q, kind, limit)
+
+def _search_like(db: Session, user_id: int, q: str, kind: str, limit: int):
+    pattern = like_pattern(q)
+    sources = {
+        "note": (models.Note, models.Note.content),
+        "task": (models.Task, models.Task.description),
+        "resource": (models.Resource, None),
+    }
+    results = []
+    for source_kind, (model, body_column) in sources.items():
+        if kind and kind != source_kind:
+            continue
+        columns = [model.title.ilike(pattern, escape="\\"), model.tags.ilike(pattern, escape="\\")]
+        if body_column is not None:
+            columns.append(body_column.ilike(pattern, escape="\\"))
+        for obj in db.query(model).filter(model.user_id == user_id, or_(*columns)).limit(limit):
+            title, body, tags = document_fields(source_kind, obj)
+            results.append({"kind": source_kind, "ref_id": obj.id, "title": title,
+                            "title_highlight": render_highlight(title), "snippet": render_highlight(body or tags), "rank": 0.0})
+    return results[:limit]
+
+# Schema (used by migrations)
+def create_index(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS search_documents (
+                doc_id BIGINT PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                kind VARCHAR NOT NULL,
+                ref_id INTEGER NOT NULL,
+                title VARCHAR,
+                body TEXT,
+                tags VARCHAR,
+                document TSVECTOR NOT NULL
+            )
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_search_documents_user_id ON search_documents (user_id)"))
+        document = POSTGRES_DOCUMENT
+        insert = "INSERT INTO search_documents (doc_id, user_id, kind, ref_id, title, body, tags, document)"
+        suffix = "ON CONFLICT (doc_id) DO NOTHING"
+    elif conn.dialect.name == "sqlite":
+        conn.execute(text("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title, body, tags, kind UNINDEXED, ref_id UNINDEXED, user_id UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        """))
+        document = None
+        insert = "INSERT OR REPLACE INTO search_index (rowid, user_id, kind, ref_id, title, body, tags)"
+        suffix = ""
+    else:
+        return
+    sources = [("note", "notes", "content"), ("task", "tasks", "description"), ("resource", "resources", "NULL")]
+    for kind, table, body in sources:
+        title, tags = "title", "tags"
+        if document is not None:
+            vector = (document.replace(":title", title).replace(":tags", tags).replace(":body", body))
+            select = f"SELECT id * 4 + {KINDS[kind]}, user_id, '{kind}', id, {title}, {body}, {tags}, {vector} FROM {table}"
+        else:
+            select = f"SELECT id * 4 + {KINDS[kind]}, user_id, '{kind}', id, {title}, {body}, {tags} FROM {table}"
+        conn.execute(text(f"{insert} {select} {suffix}"), {"language": SEARCH_LANGUAGE} if document else {})
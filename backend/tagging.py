@@ -0,0 +1,92 @@
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+import models
+
+# Normalized tag index for tasks, notes and resources.
+#
+# The comma-separated `tags` column on each model stays the source of truth
+# for the API; crud mirrors it into tags/item_tags so tag filters and
+# counts are indexed lookups instead of string splitting.
+
+ITEM_TYPES = ("task", "note", "resource")
+
+def parse_tags(value):
+    if not value:
+        return []
+    names = (name.strip().lower() for name in value.split(","))
+    return list(dict.fromkeys(name for name in names if name))
+
+def _insert_ignore(conn):
+    # Works with both a Session (crud) and a Connection (migrations).
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(models.Tag).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(models.Tag).on_conflict_do_nothing()
+    return insert(models.Tag)
+
+def _tag_ids(conn, user_id: int, names):
+    if not names:
+        return {}
+    lookup = select(models.Tag.name, models.Tag.id).where(models.Tag.user_id == user_id, models.Tag.name.in_(names))
+    ids = dict(conn.execute(lookup).all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        conn.execute(_insert_ignore(conn), [{"user_id": user_id, "name": name} for name in missing])
+        ids.update(conn.execute(lookup).all())
+    return ids
+
+def sync_item_tags(conn, user_id: int, item_type: str, items):
+    """Replace the tag links of ``items``, an iterable of ``(item_id, tags_string)``."""
+    parsed = {item_id: parse_tags(value) for item_id, value in items}
+    if not parsed:
+        return
+    names = list(dict.fromkeys(name for item_names in parsed.values() for name in item_names))
+    ids = _tag_ids(conn, user_id, names)
+    conn.execute(delete(models.ItemTag).where(
+        models.ItemTag.item_type == item_type, models.ItemTag.item_id.in_(list(parsed))
+    ))
+    links = [
+        {"tag_id": ids[name], "item_type": item_type, "item_id": item_id}
+        for item_id, item_names in parsed.items() for name in item_names
+    ]
+    if links:
+        conn.execute(insert(models.ItemTag), links)
+
+def remove_item_tags(conn, item_type: str, item_ids):
+    if item_ids:
+        conn.execute(delete(models.ItemTag).where(
+            models.ItemTag.item_type == item_type, models.ItemTag.item_id.in_(list(item_ids))
+        ))
+
+def filter_by_tag(query, model, item_type: str, user_id: int, tag: str):
+    tagged = (
+        select(models.ItemTag.item_id)
+        .join(models.Tag, models.Tag.id == models.ItemTag.tag_id)
+        .where(models.Tag.user_id == user_id, models.Tag.name == tag.strip().lower(),
+               models.ItemTag.item_type == item_type)
+    )
+    return query.filter(model.id.in_(tagged))
+
+def tag_counts(conn, user_id: int, item_type: str = None):
+    query = (
+        select(models.Tag.name, func.count(models.ItemTag.item_id).label("count"))
+        .join(models.ItemTag, models.ItemTag.tag_id == models.Tag.id)
+        .where(models.Tag.user_id == user_id)
+        .group_by(models.Tag.name)
+        .order_by(func.count(models.ItemTag.item_id).desc(), models.Tag.name)
+    )
+    if item_type is not None:
+        query = query.where(models.ItemTag.item_type == item_type)
+    return [{"name": name, "count": count} for name, count in conn.execute(query)]
+
+def backfill(conn):
+    sources = {"task": models.Task, "note": models.Note, "resource": models.Resource}
+    for item_type, model in sources.items():
+        rows = conn.execute(select(model.user_id, model.id, model.tags).where(model.tags.isnot(None))).all()
+        by_user = {}
+        for user_id, item_id, value in rows:
+            by_user.setdefault(user_id, []).append((item_id, value))
+        for user_id, items in by_user.items():
+            sync_item_tags(conn, user_id, item_type, items)
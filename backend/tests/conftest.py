@@ -0,0 +1,32 @@
+import itertools
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so point the app at a throwaway database first.
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+
+_emails = (f"user{n}@example.com" for n in itertools.count())
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+def login(client, email, password="pw"):
+    response = client.post("/token", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.fixture
+def auth_headers(client):
+    email = next(_emails)
+    assert client.post("/users/", json={"email": email, "password": "pw"}).status_code == 200
+    return {"Authorization": f"Bearer {login(client, email)['access_token']}"}
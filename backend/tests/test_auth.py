@@ -0,0 +1,19 @@
+import pytest
+from fastapi.testclient import TestClient
+import auth, main
+from conftest import login
+
+def test_password_hashing_survives_lifespan_restart(client):
+    # The session client is still open; a second app lifespan shuts the pool down on exit.
+    with TestClient(main.app) as other:
+        assert other.post("/users/", json={"email": "restart@example.com", "password": "pw"}).status_code == 200
+    assert login(client, "restart@example.com")["access_token"]
+
+def test_bounded_executor_frees_slot_when_submit_fails():
+    executor = auth.BoundedExecutor(workers=1, queue_limit=0)
+    executor._executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(sum, [1])
+    assert executor.stats()["in_flight"] == 0
+    executor.shutdown()
+    assert executor.submit(sum, [1, 2]).result() == 3
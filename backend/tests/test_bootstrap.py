@@ -0,0 +1,10 @@
+def test_user_section_has_every_field(client, auth_headers):
+    me = client.get("/users/me/", headers=auth_headers).json()
+    # The second call is served from the cached principal.
+    for _ in range(2):
+        user = client.get("/bootstrap", params={"fields": "user"}, headers=auth_headers).json()["user"]
+        assert user == {"id": me["id"], "email": me["email"], "is_active": True}
+
+def test_unselected_sections_are_left_out(client, auth_headers):
+    body = client.get("/bootstrap", params={"fields": "stats"}, headers=auth_headers).json()
+    assert set(body) == {"stats"}
@@ -0,0 +1,19 @@
+def test_patch_rejects_null_on_required_fields(client, auth_headers):
+    task = client.post("/tasks/", json={"title": "t"}, headers=auth_headers).json()
+    response = client.patch("/tasks/bulk", json=[{"id": task["id"], "title": None, "is_completed": None}], headers=auth_headers)
+    assert response.status_code == 422
+    assert {error["loc"][-1] for error in response.json()["detail"]} == {"title", "is_completed"}
+
+    session = client.post("/study-sessions/", json={"subject": "math", "duration_minutes": 30}, headers=auth_headers).json()
+    response = client.patch("/study-sessions/bulk", json=[{"id": session["id"], "duration_minutes": None}], headers=auth_headers)
+    assert response.status_code == 422
+
+    # Nothing was written, so the lists still serialize.
+    assert client.get("/tasks/", headers=auth_headers).json()[0]["title"] == "t"
+    assert client.get("/study-sessions/", headers=auth_headers).json()[0]["duration_minutes"] == 30
+
+def test_patch_allows_null_on_optional_fields(client, auth_headers):
+    task = client.post("/tasks/", json={"title": "t", "description": "d"}, headers=auth_headers).json()
+    response = client.patch("/tasks/bulk", json=[{"id": task["id"], "description": None}], headers=auth_headers)
+    assert response.json() == {"results": [{"id": task["id"], "status": "updated"}]}
+    assert client.get("/tasks/", headers=auth_headers).json()[0]["description"] is None
@@ -0,0 +1,24 @@
+import gzip
+import json
+import database, middleware
+
+def test_repeat_load_is_served_from_the_compressed_cache(client, auth_headers):
+    for i in range(40):
+        client.post("/notes/", json={"title": f"note {i}", "content": "x" * 50}, headers=auth_headers)
+    headers = dict(auth_headers, **{"Accept-Encoding": "gzip"})
+    first = client.get("/notes/", headers=headers)
+    assert first.headers["content-encoding"] == "gzip"
+
+    before = database.query_metrics.snapshot()["queries"]
+    hits = middleware.compressed_cache.stats()["hits"]
+    again = client.get("/notes/", headers=headers)
+    assert middleware.compressed_cache.stats()["hits"] == hits + 1
+    assert again.content == first.content and again.headers["etag"] == first.headers["etag"]
+    assert "Authorization" in again.headers["vary"]
+    # Only the auth and ETag lookups ran; the list query was skipped.
+    assert database.query_metrics.snapshot()["queries"] - before <= 2
+
+    client.post("/notes/", json={"title": "new"}, headers=auth_headers)
+    changed = client.get("/notes/", headers=headers)
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert len(changed.json()) == 41
@@ -0,0 +1,31 @@
+import time
+import pytest
+import recurrence
+from datetime import datetime
+
+def test_until_series_are_capped_like_count():
+    start = datetime(2026, 1, 1)
+    began = time.perf_counter()
+    with pytest.raises(recurrence.InvalidRecurrence):
+        recurrence.series_end(start, start, "FREQ=SECONDLY;UNTIL=99991231T000000")
+    assert time.perf_counter() - began < 1
+    assert recurrence.series_end(start, start, "FREQ=DAILY;UNTIL=20260110T000000") == datetime(2026, 1, 10)
+
+def test_create_event_rejects_unbounded_until(client, auth_headers):
+    event = {"title": "e", "start_time": "2026-01-01T09:00:00", "end_time": "2026-01-01T10:00:00",
+             "recurrence": "FREQ=MINUTELY;UNTIL=20270101T000000"}
+    assert client.post("/events/", json=event, headers=auth_headers).status_code == 400
+
+def test_mixed_offset_and_naive_timestamps(client, auth_headers):
+    event = {"title": "e", "start_time": "2026-01-01T09:00:00+02:00", "end_time": "2026-01-01T08:00:00"}
+    response = client.post("/events/", json=event, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["start_time"] == "2026-01-01T07:00:00"
+    event["end_time"] = "2026-01-01T06:00:00"
+    assert client.post("/events/", json=event, headers=auth_headers).status_code == 400
+
+    params = {"from": "2026-01-01T00:00:00+02:00", "to": "2026-01-01T12:00:00"}
+    [item] = client.get("/calendar", params=params, headers=auth_headers).json()
+    assert item["start"] == "2026-01-01T07:00:00"
+    params["to"] = "2025-12-31T21:00:00"
+    assert client.get("/calendar", params=params, headers=auth_headers).status_code == 400
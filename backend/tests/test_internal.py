@@ -0,0 +1,24 @@
+import pytest
+import main
+
+INTERNAL = [
+    "/internal/auth-cache",
+    "/internal/revoked-tokens",
+    "/internal/password-hasher",
+    "/internal/grade-summary-cache",
+    "/internal/compression-cache",
+    "/internal/pool",
+    "/internal/slow-queries",
+    "/internal/change-feed",
+]
+
+@pytest.mark.parametrize("path", INTERNAL)
+def test_internal_endpoints_closed_without_metrics_token(client, auth_headers, monkeypatch, path):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    assert client.get(path, headers=auth_headers).status_code == 403
+
+@pytest.mark.parametrize("path", INTERNAL)
+def test_internal_endpoints_require_metrics_token(client, auth_headers, monkeypatch, path):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "operator-secret")
+    assert client.get(path, headers=auth_headers).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer operator-secret"}).status_code == 200
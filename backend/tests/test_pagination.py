@@ -0,0 +1,24 @@
+import crud, database, models
+
+LISTS = ["/tasks/", "/notes/", "/resources/", "/projects/", "/grades/", "/events/", "/study-sessions/"]
+
+def test_out_of_range_paging_is_rejected(client, auth_headers):
+    for path in LISTS:
+        for params in ({"limit": 0}, {"limit": -1}, {"limit": 100000}, {"skip": -1}):
+            assert client.get(path, params=params, headers=auth_headers).status_code == 422, (path, params)
+
+def test_cursor_pages_walk_the_whole_list(client, auth_headers):
+    for i in range(5):
+        client.post("/notes/", json={"title": f"n{i}"}, headers=auth_headers)
+    titles, params = [], {"limit": 2, "cursor": ""}
+    while True:
+        page = client.get("/notes/", params=params, headers=auth_headers).json()
+        titles += [note["title"] for note in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert titles == [f"n{i}" for i in range(5)]
+
+def test_paginate_handles_an_empty_page():
+    with database.SessionLocal() as db:
+        assert crud.paginate(db.query(models.Note), models.Note, 1, limit=0) == ([], None)
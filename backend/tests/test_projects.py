@@ -0,0 +1,8 @@
+def test_tasks_are_a_list_with_or_without_include(client, auth_headers):
+    project = client.post("/projects/", json={"title": "p"}, headers=auth_headers).json()
+    client.post("/tasks/", json={"title": "t", "project_id": project["id"]}, headers=auth_headers)
+    plain = client.get("/projects/", headers=auth_headers).json()
+    assert plain[0]["tasks"] == []
+    assert plain[0]["progress"]["total"] == 1
+    included = client.get("/projects/", params={"include": "tasks"}, headers=auth_headers).json()
+    assert [task["title"] for task in included[0]["tasks"]] == ["t"]
@@ -0,0 +1,22 @@
+import database, search
+
+def test_highlights_escape_stored_markup(client, auth_headers):
+    client.post("/notes/", json={"title": "<img src=x onerror=alert(1)> hello", "content": "<b>hello</b> world"}, headers=auth_headers)
+    [result] = client.get("/search", params={"q": "hello"}, headers=auth_headers).json()
+    assert result["title_highlight"] == "&lt;img src=x onerror=alert(1)&gt; <mark>hello</mark>"
+    assert "<mark>hello</mark>" in result["snippet"]
+    assert "<img" not in result["snippet"] and "<b>" not in result["snippet"]
+
+def test_like_fallback_matches_wildcards_literally(client, auth_headers):
+    client.post("/notes/", json={"title": "100% done"}, headers=auth_headers)
+    client.post("/notes/", json={"title": "<i>fully</i> done"}, headers=auth_headers)
+    user_id = client.get("/users/me/", headers=auth_headers).json()["id"]
+    with database.SessionLocal() as db:
+        assert [r["title"] for r in search._search_like(db, user_id, "%", None, 20)] == ["100% done"]
+        assert search._search_like(db, user_id, "_", None, 20) == []
+        [result] = search._search_like(db, user_id, "fully", None, 20)
+    assert result["title_highlight"] == "&lt;i&gt;fully&lt;/i&gt; done"
+
+def test_search_limit_is_bounded(client, auth_headers):
+    for limit in (0, -1, 101):
+        assert client.get("/search", params={"q": "x", "limit": limit}, headers=auth_headers).status_code == 422
@@ -0,0 +1,37 @@
+import crud, database, models
+
+def user_id(client, auth_headers):
+    return client.get("/users/me/", headers=auth_headers).json()["id"]
+
+def stored_stats(uid):
+    with database.SessionLocal() as db:
+        row = db.get(models.UserStats, uid)
+        return row and {name: getattr(row, name) for name in crud.STATS_COUNTERS}
+
+def aggregate(uid):
+    with database.SessionLocal() as db:
+        return crud.aggregate_stats(db, uid)
+
+def test_writes_before_first_read_start_the_counters(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(crud, "MATERIALIZED_STATS", True)
+    uid = user_id(client, auth_headers)
+    client.post("/tasks/", json={"title": "a"}, headers=auth_headers)
+    client.post("/study-sessions/", json={"subject": "math", "duration_minutes": 30}, headers=auth_headers)
+    client.post("/tasks/bulk", json=[{"title": "b"}, {"title": "c", "is_completed": True}], headers=auth_headers)
+    assert stored_stats(uid) == aggregate(uid) == {
+        "pending_tasks": 2, "notes_count": 0, "study_minutes": 30, "study_sessions_count": 1,
+    }
+    assert client.get("/stats/", headers=auth_headers).json()["pending_tasks"] == 2
+
+def test_first_read_backfills_in_one_statement(client, auth_headers, monkeypatch):
+    uid = user_id(client, auth_headers)
+    client.post("/notes/", json={"title": "n"}, headers=auth_headers)  # counters off: no row yet
+    assert stored_stats(uid) is None
+    monkeypatch.setattr(crud, "MATERIALIZED_STATS", True)
+    assert client.get("/stats/", headers=auth_headers).json()["notes_created"] == 1
+    with database.SessionLocal() as db:
+        # A second backfill leaves the existing row alone.
+        crud._insert_stats(db, uid)
+        db.commit()
+    client.post("/notes/", json={"title": "m"}, headers=auth_headers)
+    assert stored_stats(uid)["notes_count"] == aggregate(uid)["notes_count"] == 2
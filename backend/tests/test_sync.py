@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import crud, database, models
+
+def sync(client, auth_headers, since=None):
+    params = {"collections": "tasks", **({"since": since} if since else {})}
+    response = client.get("/sync", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_boolean_versions_are_rejected(client, auth_headers):
+    for token in (crud.encode_sync_token({"tasks": True}), crud.encode_sync_token({"tasks": "1"})):
+        assert client.get("/sync", params={"since": token}, headers=auth_headers).status_code == 400
+
+def test_tokens_older_than_pruned_tombstones_resync(client, auth_headers):
+    ids = [client.post("/tasks/", json={"title": f"t{i}"}, headers=auth_headers).json()["id"] for i in range(3)]
+    old_token = sync(client, auth_headers)["token"]
+    client.delete(f"/tasks/{ids[0]}", headers=auth_headers)
+    recent_token = sync(client, auth_headers)["token"]
+    with database.SessionLocal() as db:
+        db.execute(update(models.Tombstone).where(models.Tombstone.ref_id == ids[0])
+                   .values(deleted_at=datetime.utcnow() - timedelta(days=crud.TOMBSTONE_RETENTION_DAYS + 1)))
+        db.commit()
+    # The next delete prunes the expired tombstone.
+    client.delete(f"/tasks/{ids[1]}", headers=auth_headers)
+
+    stale = sync(client, auth_headers, old_token)["tasks"]
+    assert stale["reset"] is True
+    assert [task["id"] for task in stale["upserted"]] == [ids[2]]
+    assert stale["deleted"] == []
+
+    recent = sync(client, auth_headers, recent_token)["tasks"]
+    assert recent["reset"] is False
+    assert recent["deleted"] == [ids[1]]
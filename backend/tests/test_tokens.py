@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+import uuid
+import pytest
+from jose import JWTError, jwt
+import auth, crud, database, models
+from conftest import login
+
+# Key ring
+def test_rotated_keys_still_verify_old_tokens():
+    old = auth.KeyRing({"default": "s0", "2026-01": "s1"}, "2026-01")
+    token = old.sign({"sub": "a"})
+    rotated = auth.KeyRing({"default": "s0", "2026-01": "s1", "2026-07": "s2"}, "2026-07")
+    assert rotated.verify(token)["sub"] == "a"
+    assert jwt.get_unverified_header(rotated.sign({"sub": "a"}))["kid"] == "2026-07"
+
+def test_dropped_or_unknown_keys_are_rejected():
+    token = auth.KeyRing({"default": "s0", "2026-01": "s1"}, "2026-01").sign({"sub": "a"})
+    with pytest.raises(JWTError):
+        auth.KeyRing({"default": "s0", "2026-07": "s2"}, "2026-07").verify(token)
+
+def test_tokens_without_kid_use_the_default_key():
+    token = jwt.encode({"sub": "a"}, "s0", algorithm=auth.ALGORITHM)
+    assert auth.KeyRing({"default": "s0"}, "default").verify(token)["sub"] == "a"
+
+# Revocation filter
+def test_filter_has_no_false_negatives_and_counts_each_id_once():
+    revoked = auth.RevocationFilter(1000, 0.01)
+    ids = [uuid.uuid4().hex for _ in range(1000)]
+    for jti in ids + ids[:10]:
+        revoked.add(jti)
+    assert all(revoked.might_contain(jti) for jti in ids)
+    assert revoked.count <= 1000
+    misses = sum(revoked.might_contain(uuid.uuid4().hex) for _ in range(1000))
+    assert misses < 50
+
+def test_rebuild_keeps_old_bits_until_swap_and_replays_local_adds():
+    revoked = auth.RevocationFilter(2, 0.01)
+    now = datetime.utcnow()
+    assert not revoked.apply([(now, "a"), (now, "b"), (now, "c")], now)
+    revoked.begin_rebuild()
+    revoked.add("d")  # revoked locally while the rebuild query runs
+    assert all(revoked.might_contain(jti) for jti in "abcd")
+    revoked.rebuild(revoked.capacity * 2, [(now, "a"), (now, "b"), (now, "c")])
+    assert revoked.capacity == 4
+    assert all(revoked.might_contain(jti) for jti in "abcd")
+
+def test_sync_picks_up_revocations_that_commit_late():
+    revoked = auth.RevocationFilter(100, 0.01)
+    jti = uuid.uuid4().hex
+    with database.SessionLocal() as db:
+        first_sync = datetime.utcnow()
+        revoked.apply(crud.get_revocations(db, revoked.synced_through), first_sync)
+        # Stamped before the first sync but only committed after it.
+        db.add(models.RevokedToken(jti=jti, expires_at=first_sync + timedelta(hours=1),
+                                   revoked_at=first_sync - timedelta(seconds=5)))
+        db.commit()
+        assert not revoked.might_contain(jti)
+        revoked.apply(crud.get_revocations(db, revoked.synced_through), datetime.utcnow())
+    assert revoked.might_contain(jti)
+
+# Refresh and logout
+def test_refresh_tokens_are_single_use(client, auth_headers):
+    email = client.get("/users/me/", headers=auth_headers).json()["email"]
+    pair = login(client, email)
+    response = client.post("/token/refresh", json={"refresh_token": pair["refresh_token"]})
+    assert response.status_code == 200
+    assert client.post("/token/refresh", json={"refresh_token": pair["refresh_token"]}).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": response.json()["refresh_token"]}).status_code == 200
+
+def test_access_token_is_not_a_refresh_token(client, auth_headers):
+    access = auth_headers["Authorization"].split()[1]
+    assert client.post("/token/refresh", json={"refresh_token": access}).status_code == 401
+
+def test_logout_revokes_access_and_refresh_tokens(client, auth_headers):
+    email = client.get("/users/me/", headers=auth_headers).json()["email"]
+    pair = login(client, email)
+    headers = {"Authorization": f"Bearer {pair['access_token']}"}
+    assert client.get("/users/me/", headers=headers).status_code == 200
+    assert client.post("/logout", json={"refresh_token": pair["refresh_token"]}, headers=headers).status_code == 204
+    assert client.get("/users/me/", headers=headers).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": pair["refresh_token"]}).status_code == 401